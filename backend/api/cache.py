@@ -0,0 +1,152 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+from recipes.models import Recipe
+
+KEY_PREFIX = 'foodgram'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def get_tag_versions(tags):
+    """Текущие версии тегов; для отсутствующих тегов заводит новые."""
+    cache = get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    stored = cache.get_many(keys)
+    missing = {
+        key: uuid.uuid4().hex for key in keys if key not in stored
+    }
+    if missing:
+        cache.set_many(missing, timeout=None)
+        stored.update(missing)
+    return {keys[key]: version for key, version in stored.items()}
+
+
+def invalidate_tags(*tags):
+    """Делает недействительными все записи, помеченные любым из tags."""
+    get_cache().set_many(
+        {_tag_key(tag): uuid.uuid4().hex for tag in tags}, timeout=None
+    )
+
+
+def _incr(key):
+    cache = get_cache()
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def get_cache_stats():
+    cache = get_cache()
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': stats.get(HITS_KEY, 0),
+        'misses': stats.get(MISSES_KEY, 0),
+    }
+
+
+def get_response_key(request, prefix):
+    """Ключ записи: префикс представления и нормализованный query string."""
+    query = '&'.join(
+        f'{name}={value}'
+        for name in sorted(request.query_params)
+        for value in sorted(request.query_params.getlist(name))
+    )
+    digest = hashlib.md5(
+        f'{request.get_host()}{request.path}?{query}'.encode('utf-8')
+    ).hexdigest()
+    return f'{KEY_PREFIX}:response:{prefix}:{digest}'
+
+
+def resolve_legacy_short_code(code):
+    """id рецепта по старому случайному коду; найденные коды кэшируются."""
+    key = f'{KEY_PREFIX}:short_link:{code}'
+    cache = get_cache()
+    recipe_id = cache.get(key)
+    if recipe_id is None:
+        recipe_id = Recipe.objects.filter(
+            short_link=code
+        ).values_list('id', flat=True).first()
+        if recipe_id is not None:
+            cache.set(key, recipe_id, timeout=None)
+    return recipe_id
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует ответы list/retrieve для анонимных пользователей.
+
+    Запись хранит версии своих тегов на момент записи и считается
+    устаревшей, как только версия любого из тегов меняется.
+    """
+
+    cache_prefix = None
+
+    def get_cache_base_tags(self):
+        """Теги, известные до выполнения запроса."""
+        return []
+
+    def get_cache_tags(self, data):
+        """Дополнительные теги, зависящие от содержимого ответа."""
+        return []
+
+    def get_cache_key_suffix(self):
+        """Версия данных в памяти процесса, от которых зависит ответ.
+
+        Входит в ключ записи: процесс с устаревшими данными не подменит
+        ими ответ процесса, у которого они свежее.
+        """
+        return ''
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+
+        cache = get_cache()
+        key = get_response_key(request, self.cache_prefix)
+        suffix = self.get_cache_key_suffix()
+        if suffix:
+            key = f'{key}:{suffix}'
+        entry = cache.get(key)
+        if entry is not None:
+            tags, data = entry
+            if get_tag_versions(tags) == tags:
+                _incr(HITS_KEY)
+                response = Response(data)
+                response['X-Cache'] = 'HIT'
+                return response
+
+        _incr(MISSES_KEY)
+        # Версии базовых тегов фиксируются до построения ответа, чтобы
+        # инвалидация во время запроса не оставила в кэше старые данные.
+        base_tags = get_tag_versions(self.get_cache_base_tags())
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            tags = get_tag_versions(self.get_cache_tags(response.data))
+            tags.update(base_tags)
+            cache.set(
+                key, (tags, response.data), settings.RESPONSE_CACHE_TIMEOUT
+            )
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,110 @@
+import hashlib
+from calendar import timegm
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import (
+    get_conditional_response,
+    patch_vary_headers,
+    quote_etag,
+)
+from django.utils.http import http_date
+
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+VIEWER_RELATIONS = (Favorite, ShoppingCart, Subscription)
+
+
+def _aggregate_subquery(model, aggregate):
+    return Subquery(
+        model.objects.filter(
+            user=OuterRef('pk')
+        ).order_by().values('user').annotate(
+            value=aggregate
+        ).values('value')
+    )
+
+
+def get_viewer_state(user):
+    """Версия избранного, корзины и подписок пользователя одним запросом.
+
+    Количество записей и наибольший id меняются при любом добавлении
+    или удалении, поэтому их достаточно, чтобы отличить состояния.
+    """
+    annotations = {}
+    for model in VIEWER_RELATIONS:
+        name = model._meta.model_name
+        annotations[f'{name}_count'] = _aggregate_subquery(model, Count('id'))
+        annotations[f'{name}_max_id'] = _aggregate_subquery(model, Max('id'))
+    return tuple(
+        User.objects.filter(pk=user.pk).annotate(
+            **annotations
+        ).values_list(*annotations).first() or ()
+    )
+
+
+def to_timestamp(value):
+    return timegm(value.utctimetuple())
+
+
+class ConditionalGetMixin:
+    """Отвечает 304 на list/retrieve, если данные не изменились.
+
+    ETag строится до выполнения запроса из дешёвых значений: меток
+    updated и версий тегов кэша. Для авторизованных
+    пользователей в него входит ещё и состояние их избранного, корзины
+    и подписок, от которого зависят флаги в ответе.
+    """
+
+    etag_depends_on_viewer = True
+
+    def get_list_version(self, request):
+        """Значения, от которых зависит ответ list, или None."""
+        return None
+
+    def get_object_version(self, request, *args, **kwargs):
+        """Значения для retrieve и время изменения объекта, или None."""
+        return None
+
+    def _conditional_response(self, handler, version, request, *args,
+                              **kwargs):
+        if version is None:
+            return handler(request, *args, **kwargs)
+        parts, last_modified = version
+        if self.etag_depends_on_viewer and request.user.is_authenticated:
+            parts = (*parts, request.user.pk, *get_viewer_state(request.user))
+            # Флаги в ответе меняются без изменения самих объектов.
+            last_modified = None
+        etag = quote_etag(hashlib.md5(
+            repr((request.get_host(), request.get_full_path(), parts)).encode()
+        ).hexdigest())
+        if last_modified is not None:
+            last_modified = to_timestamp(last_modified)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().list, self.get_list_version(request),
+            request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().retrieve,
+            self.get_object_version(request, *args, **kwargs),
+            request, *args, **kwargs
+        )
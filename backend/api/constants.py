@@ -18,5 +18,7 @@ MIN_COOKING_TIME = 1
 """Минимальное время приготовления в минутах."""
 MAX_COOKING_TIME = 1440
 """Максимальное время приготовления в минутах."""
-DEFAULT_SHORT_CODE_LENGTH = 6 
-"""Длина короткого кода."""
\ No newline at end of file
+SHORT_CODE_LENGTH = 7
+"""Минимальная длина короткого кода."""
+LEGACY_SHORT_CODE_LENGTH = 6
+"""Длина случайных коротких кодов, выданных до перехода на id."""
\ No newline at end of file
@@ -0,0 +1,126 @@
+import base64
+import binascii
+import re
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    InMemoryUploadedFile,
+    TemporaryUploadedFile,
+)
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+DATA_URL_RE = re.compile(r'data:image/(?P<ext>[a-z0-9.+-]{1,10});base64,')
+DATA_URL_HEADER_LENGTH = 32
+"""Заголовок data URL ищется только в начале строки."""
+DECODE_CHUNK_SIZE = 64 * 1024
+"""Размер порции base64 при декодировании."""
+
+
+WHITESPACE = ' \t\n\r\x0b\x0c'
+WHITESPACE_RE = re.compile(r'[ \t\n\r\x0b\x0c]+')
+"""Пробельные символы ASCII, которыми base64 разбивают на строки."""
+
+
+def get_decoded_size(data, start):
+    """Размер декодированных данных по длине base64, без декодирования."""
+    length = len(data) - start - sum(
+        data.count(char, start) for char in WHITESPACE
+    )
+    tail = WHITESPACE_RE.sub('', data[max(start, len(data) - 64):])
+    padding = tail.endswith('==') + tail.endswith('=')
+    return length // 4 * 3 - padding
+
+
+class DecodedTemporaryFile(TemporaryUploadedFile):
+    """Временный файл, который закрывается при сборке мусора.
+
+    Хранилище может переместить его при сохранении, а закрывать файл,
+    как это делает обработчик загрузок Django, здесь некому.
+    """
+
+    def __del__(self):
+        self.close()
+
+
+class Base64ImageField(serializers.ImageField):
+    """Картинка в виде data URL с base64.
+
+    Размер проверяется по длине строки до декодирования, а размер в
+    пикселях — по заголовку изображения до его распаковки. Данные
+    декодируются порциями: небольшие файлы в память, крупные (больше
+    FILE_UPLOAD_MAX_MEMORY_SIZE) во временный файл на диске.
+    """
+
+    default_error_messages = {
+        'too_large': (
+            'Размер изображения не должен превышать {max_bytes} байт.'
+        ),
+        'too_many_pixels': (
+            'Изображение не должно содержать больше {max_pixels} пикселей.'
+        ),
+        'invalid_base64': 'Некорректные данные base64.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('data:image'):
+            data = self.decode(data)
+            self.check_pixels(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        match = DATA_URL_RE.match(data[:DATA_URL_HEADER_LENGTH])
+        if match is None:
+            self.fail('invalid_image')
+        start = match.end()
+        max_bytes = settings.IMAGE_UPLOAD_MAX_BYTES
+        size = get_decoded_size(data, start)
+        if size > max_bytes:
+            self.fail('too_large', max_bytes=max_bytes)
+
+        ext = match.group('ext')
+        name = f'{uuid.uuid4()}.{ext}'
+        content_type = f'image/{ext}'
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = DecodedTemporaryFile(name, content_type, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, size, None
+            )
+        # Пробелы и переводы строк отбрасываются, как их отбрасывал
+        # нестрогий b64decode; остаток порции не кратный 4 переносится
+        # в следующую.
+        leftover = ''
+        try:
+            for position in range(start, len(data), DECODE_CHUNK_SIZE):
+                chunk = leftover + WHITESPACE_RE.sub(
+                    '', data[position:position + DECODE_CHUNK_SIZE]
+                )
+                usable = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:usable], validate=True))
+                leftover = chunk[usable:]
+            if leftover:
+                raise binascii.Error('Incorrect padding')
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_pixels(self, file):
+        """Проверяет размеры по заголовку, не распаковывая изображение."""
+        max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
+        except (UnidentifiedImageError, OSError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if width * height > max_pixels:
+            self.fail('too_many_pixels', max_pixels=max_pixels)
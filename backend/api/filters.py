@@ -1,11 +1,18 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework as filters
 
+from recipes.fulltext import search_recipes
 from recipes.models import Ingredient, Recipe
 
+from .search import search_by_pantry
+
 User = get_user_model()
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
 class IngredientFilter(filters.FilterSet):
     name = filters.CharFilter(lookup_expr='istartswith')
     
@@ -18,17 +25,38 @@ class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_is_in_shopping_cart')
+    search = filters.CharFilter(method='filter_search')
+    max_missing = filters.NumberFilter(method='filter_max_missing')
+    pantry = NumberInFilter(method='filter_pantry')
     
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+            'max_missing', 'pantry'
+        )
     
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
     
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
-            return queryset.filter(shopping_cart__user=self.request.user)
-        return queryset 
\ No newline at end of file
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+    
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value) 
+    
+    def filter_max_missing(self, queryset, name, value):
+        # Применяется вместе с pantry в filter_pantry.
+        return queryset
+    
+    def filter_pantry(self, queryset, name, value):
+        max_missing = self.form.cleaned_data.get('max_missing')
+        return search_by_pantry(
+            queryset,
+            [int(ingredient_id) for ingredient_id in value],
+            None if max_missing is None else int(max_missing),
+        )
@@ -0,0 +1,125 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = 'WEBP'
+VARIANT_EXTENSION = 'webp'
+VARIANT_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_variant_name(name, variant):
+    """Путь варианта рядом с оригиналом: images/variants/abc.thumbnail.webp."""
+    directory, filename = posixpath.split(name)
+    root = posixpath.splitext(filename)[0]
+    return posixpath.join(
+        directory, 'variants', f'{root}.{variant}.{VARIANT_EXTENSION}'
+    )
+
+
+def get_variant_urls(image, variants_source, request=None):
+    """URL вариантов картинки; пока они не готовы, отдаётся оригинал.
+
+    Готовность берётся из поля *_variants_source объекта, которое
+    заполняет on_ready после создания вариантов, так что хранилище
+    при сериализации не опрашивается.
+    """
+    if not image:
+        return None
+    ready = variants_source == image.name
+    original_url = image.url
+    urls = {}
+    for variant in settings.IMAGE_VARIANTS:
+        url = (
+            default_storage.url(get_variant_name(image.name, variant))
+            if ready else original_url
+        )
+        urls[variant] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+def generate_variants(name):
+    """Создаёт недостающие WebP-варианты изображения name.
+
+    Возвращает количество созданных вариантов.
+    """
+    missing = {
+        variant: size
+        for variant, size in settings.IMAGE_VARIANTS.items()
+        if not default_storage.exists(get_variant_name(name, variant))
+    }
+    if not missing:
+        return 0
+    with default_storage.open(name, 'rb') as file:
+        with Image.open(file) as original:
+            original = ImageOps.exif_transpose(original)
+            mode = 'RGBA' if 'A' in original.getbands() else 'RGB'
+            original = original.convert(mode)
+            for variant, size in missing.items():
+                image = original.copy()
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                content = ContentFile(b'')
+                image.save(
+                    content, VARIANT_FORMAT, quality=VARIANT_QUALITY
+                )
+                default_storage.save(
+                    get_variant_name(name, variant), content
+                )
+    return len(missing)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                    thread_name_prefix='image-variants',
+                )
+    return _executor
+
+
+def _process(name, on_ready):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('Не удалось создать варианты изображения %s', name)
+        return
+    if on_ready is not None:
+        try:
+            on_ready()
+        finally:
+            # Поток пула живёт долго: соединение, открытое on_ready,
+            # закрывается по тем же правилам, что и в конце запроса.
+            close_old_connections()
+
+
+def schedule_variants(name, on_ready=None):
+    """Ставит создание вариантов в очередь после фиксации транзакции.
+
+    on_ready вызывается, когда все варианты готовы, в том числе если они
+    уже были созданы для такой же картинки раньше. При
+    IMAGE_PROCESSING_WORKERS = 0 варианты создаются синхронно.
+    """
+    if not name:
+        return
+
+    def submit():
+        if settings.IMAGE_PROCESSING_WORKERS:
+            _get_executor().submit(_process, name, on_ready)
+        else:
+            _process(name, on_ready)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,277 @@
+import heapq
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from time import monotonic
+
+from django.conf import settings
+
+from recipes.models import Ingredient, RecipeIngredient
+
+from .cache import get_tag_versions
+from .serializers import IngredientSerializer
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAX_CHAR = chr(0x10ffff)
+WORD_RE = re.compile(r'\w+')
+TRIGRAM_SIMILARITY_THRESHOLD = 0.3
+"""Порог похожести слов для нечёткого поиска, как в pg_trgm."""
+
+
+def get_words(text):
+    return WORD_RE.findall(text.lower())
+
+
+def get_trigrams(word):
+    """Триграммы слова, дополненного пробелами, как в pg_trgm."""
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientPrefixIndex:
+    """Отсортированный по названию список ингредиентов в памяти процесса.
+
+    Строится лениво при первом запросе и перестраивается, когда меняется
+    версия тега ingredients в общем кэше (запись ингредиентов или
+    load_ingredients). Хранит уже сериализованные ответы.
+    """
+
+    tag = 'ingredients'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = ([], [], [], {})
+
+    def _current_version(self):
+        return get_tag_versions([self.tag])[self.tag]
+
+    def _build(self, version):
+        ingredients = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (ingredient.name.lower(), ingredient.id)
+        )
+        keys = [ingredient.name.lower() for ingredient in ingredients]
+        items = list(IngredientSerializer(ingredients, many=True).data)
+        words = []
+        postings = {}
+        for position, key in enumerate(keys):
+            item_words = get_words(key)
+            words.append(item_words)
+            for word_position, word in enumerate(item_words):
+                for trigram in get_trigrams(word):
+                    postings.setdefault(trigram, []).append(
+                        (position, word_position)
+                    )
+        # Все структуры подменяются одной ссылкой, чтобы параллельные
+        # читатели не увидели их в несогласованном состоянии.
+        self._snapshot = (keys, items, words, postings)
+        self._version = version
+
+    def _ensure_fresh(self):
+        version = self._current_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+
+    def all(self):
+        self._ensure_fresh()
+        return self._snapshot[1]
+
+    def search(self, prefix):
+        """Ингредиенты, название которых начинается с prefix, без регистра."""
+        self._ensure_fresh()
+        keys, items = self._snapshot[:2]
+        start, end = self._prefix_range(keys, prefix.lower())
+        return items[start:end]
+
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        start = bisect_left(keys, prefix)
+        return start, bisect_left(keys, prefix + MAX_CHAR, lo=start)
+
+    def search_ranked(self, query, limit):
+        """Поиск с ранжированием: начало названия, начало слова, триграммы."""
+        self._ensure_fresh()
+        keys, items, words, postings = self._snapshot
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        start, end = self._prefix_range(keys, query)
+        found = list(range(start, min(end, start + limit)))
+        seen = set(range(start, end))
+        for position, item_words in enumerate(words):
+            if len(found) >= limit:
+                return [items[position] for position in found]
+            if position not in seen and any(
+                word.startswith(query) for word in item_words
+            ):
+                found.append(position)
+                seen.add(position)
+        if len(found) >= limit:
+            return [items[position] for position in found]
+
+        query_trigrams = set().union(
+            *(get_trigrams(word) for word in get_words(query))
+        )
+        shared = Counter(
+            posting
+            for trigram in query_trigrams
+            for posting in postings.get(trigram, ())
+        )
+        similarity = {}
+        for (position, word_position), count in shared.items():
+            if position in seen:
+                continue
+            word_trigrams = get_trigrams(words[position][word_position])
+            score = count / (
+                len(query_trigrams) + len(word_trigrams) - count
+            )
+            if score > similarity.get(position, 0):
+                similarity[position] = score
+        fuzzy = sorted(
+            (
+                position for position, score in similarity.items()
+                if score >= TRIGRAM_SIMILARITY_THRESHOLD
+            ),
+            key=lambda position: (-similarity[position], position)
+        )
+        found.extend(fuzzy[:limit - len(found)])
+        return [items[position] for position in found]
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+class RecipeIngredientIndex:
+    """Инвертированный индекс: ингредиент → массив id рецептов с ним.
+
+    Живёт в памяти процесса, как IngredientPrefixIndex, и
+    перестраивается при смене версии тега recipes, но не чаще раза в
+    PANTRY_INDEX_MAX_STALENESS секунд: рецепты меняются куда чаще
+    ингредиентов. Поэтому ответы, построенные по индексу, кэшируются
+    с версией, по которой он построен (get_version), а не с текущей.
+
+    С NumPy пересечение считается над массивами целиком, без него —
+    Counter по массивам id.
+    """
+
+    tag = 'recipes'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = None
+        self._snapshot = ({}, Counter())
+
+    def _current_version(self):
+        return get_tag_versions([self.tag])[self.tag]
+
+    def _build(self, version):
+        postings = {}
+        sizes = Counter()
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        for ingredient_id, recipe_id in rows.iterator():
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array('q')
+            postings[ingredient_id].append(recipe_id)
+            sizes[recipe_id] += 1
+        if numpy is not None:
+            postings = {
+                ingredient_id: numpy.frombuffer(recipe_ids, dtype=numpy.int64)
+                for ingredient_id, recipe_ids in postings.items()
+            }
+            recipe_ids = sorted(sizes)
+            sizes = (
+                numpy.array(recipe_ids, dtype=numpy.int64),
+                numpy.array(
+                    [sizes[recipe_id] for recipe_id in recipe_ids],
+                    dtype=numpy.int64,
+                ),
+            )
+        self._snapshot = (postings, sizes)
+        self._version = version
+        self._built_at = monotonic()
+
+    def _is_fresh(self, version):
+        return version == self._version or (
+            self._built_at is not None
+            and monotonic() - self._built_at
+            < settings.PANTRY_INDEX_MAX_STALENESS
+        )
+
+    def _ensure_fresh(self):
+        version = self._current_version()
+        if not self._is_fresh(version):
+            with self._lock:
+                if not self._is_fresh(version):
+                    self._build(version)
+
+    def get_version(self):
+        """Версия тега recipes, по которой построен текущий индекс."""
+        self._ensure_fresh()
+        return self._version
+
+    def rank(self, pantry, max_missing=None, limit=None):
+        """Рецепты с ингредиентами из pantry, от самых полных.
+
+        Возвращает тройки (недостаёт, есть, recipe_id): сначала рецепты,
+        которым не хватает меньше ингредиентов, при равенстве — те, где
+        из pantry используется больше.
+        """
+        self._ensure_fresh()
+        postings, sizes = self._snapshot
+        found = [
+            postings[ingredient_id] for ingredient_id in set(pantry)
+            if ingredient_id in postings
+        ]
+        if not found:
+            return []
+        if numpy is not None:
+            return self._rank_numpy(found, sizes, max_missing, limit)
+        have = Counter()
+        for recipe_ids in found:
+            have.update(recipe_ids)
+        ranked = (
+            (sizes[recipe_id] - count, count, recipe_id)
+            for recipe_id, count in have.items()
+        )
+        if max_missing is not None:
+            ranked = (item for item in ranked if item[0] <= max_missing)
+        key = (lambda item: (item[0], -item[1], -item[2]))
+        if limit is None:
+            return sorted(ranked, key=key)
+        return heapq.nsmallest(limit, ranked, key=key)
+
+    @staticmethod
+    def _rank_numpy(found, sizes, max_missing, limit):
+        size_ids, size_values = sizes
+        recipe_ids, have = numpy.unique(
+            numpy.concatenate(found), return_counts=True
+        )
+        missing = size_values[numpy.searchsorted(size_ids, recipe_ids)] - have
+        if max_missing is not None:
+            keep = missing <= max_missing
+            recipe_ids, have, missing = (
+                recipe_ids[keep], have[keep], missing[keep]
+            )
+        # lexsort сортирует по последнему ключу, затем по предыдущим.
+        order = numpy.lexsort((-recipe_ids, -have, missing))[:limit]
+        return list(zip(
+            missing[order].tolist(),
+            have[order].tolist(),
+            recipe_ids[order].tolist(),
+        ))
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
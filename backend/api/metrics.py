@@ -0,0 +1,170 @@
+import hashlib
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+
+from rest_framework import serializers
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+NUMBER_RE = re.compile(r'\b\d+\b')
+PLACEHOLDERS_RE = re.compile(r'\((?:%s, )+%s\)')
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def get_fingerprint(sql):
+    """Короткий отпечаток запроса без учёта чисел и длины списков IN."""
+    normalized = PLACEHOLDERS_RE.sub('(%s)', NUMBER_RE.sub('?', sql))
+    return hashlib.md5(normalized.encode()).hexdigest()[:8]
+
+
+class RequestProfile:
+    """Замеры одного запроса: SQL, сериализация и повторы запросов."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += perf_counter() - start
+            self.query_count += 1
+            fingerprint = get_fingerprint(sql)
+            self.fingerprints[fingerprint] += 1
+            self.statements.setdefault(fingerprint, sql)
+
+    def get_duplicates(self):
+        """Отпечатки запросов, выполненных больше одного раза."""
+        return [
+            (fingerprint, count)
+            for fingerprint, count in self.fingerprints.most_common()
+            if count > 1
+        ]
+
+
+class ProfiledSerializerMixin(serializers.Serializer):
+    """Засчитывает время to_representation в профиль запроса.
+
+    Вложенные сериализаторы уже входят во время внешнего и повторно
+    не учитываются. Без активного профиля стоит одного чтения ContextVar.
+    """
+
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None or profile.serializing:
+            return super().to_representation(instance)
+        profile.serializing = True
+        start = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializer_time += perf_counter() - start
+            profile.serializing = False
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, label, value):
+        counts, total = self.series.get(
+            label, ([0] * (len(self.buckets) + 1), 0)
+        )
+        counts[bisect_left(self.buckets, value)] += 1
+        self.series[label] = (counts, total + value)
+
+    def render(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for label, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield (
+                    f'{self.name}_bucket{{view="{label}",le="{bound}"}} '
+                    f'{cumulative}'
+                )
+            yield f'{self.name}_sum{{view="{label}"}} {total}'
+            yield f'{self.name}_count{{view="{label}"}} {cumulative}'
+
+
+class Registry:
+    """Гистограммы по представлениям в памяти процесса.
+
+    Каждый процесс gunicorn отдаёт в /metrics только свои замеры.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_duration = Histogram(
+            'foodgram_request_duration_seconds',
+            'Время обработки запроса',
+            DURATION_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            'foodgram_request_sql_duration_seconds',
+            'Суммарное время SQL-запросов за запрос',
+            DURATION_BUCKETS,
+        )
+        self.serializer_duration = Histogram(
+            'foodgram_request_serializer_duration_seconds',
+            'Время сериализации ответа',
+            DURATION_BUCKETS,
+        )
+        self.query_count = Histogram(
+            'foodgram_request_queries',
+            'Количество SQL-запросов за запрос',
+            QUERY_COUNT_BUCKETS,
+        )
+        self.duplicate_queries = Counter()
+
+    def record(self, view, duration, profile):
+        duplicates = sum(
+            count - 1 for _, count in profile.get_duplicates()
+        )
+        with self._lock:
+            self.request_duration.observe(view, duration)
+            self.sql_duration.observe(view, profile.sql_time)
+            self.serializer_duration.observe(view, profile.serializer_time)
+            self.query_count.observe(view, profile.query_count)
+            self.duplicate_queries[view] += duplicates
+
+    def render(self, extra=()):
+        with self._lock:
+            lines = []
+            for histogram in (
+                self.request_duration,
+                self.sql_duration,
+                self.serializer_duration,
+                self.query_count,
+            ):
+                lines.extend(histogram.render())
+            name = 'foodgram_duplicate_queries_total'
+            lines.append(
+                f'# HELP {name} Повторные выполнения одного и того же запроса'
+            )
+            lines.append(f'# TYPE {name} counter')
+            for view, count in sorted(self.duplicate_queries.items()):
+                lines.append(f'{name}{{view="{view}"}} {count}')
+        lines.extend(extra)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,72 @@
+import logging
+import random
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import RequestProfile, current_profile, registry
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceMiddleware:
+    """Замеряет выборку запросов: время, SQL, сериализацию, повторы.
+
+    Доля замеряемых запросов задаётся PERF_SAMPLE_RATE; остальные
+    проходят без обёрток. Результат попадает в заголовок Server-Timing
+    и в гистограммы /metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PERF_SAMPLE_RATE
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        duration = perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        registry.record(view, duration, profile)
+        duplicates = profile.get_duplicates()
+        if duplicates:
+            logger.info(
+                'Повторные запросы в %s: %s', view,
+                '; '.join(
+                    f'{count}x {profile.statements[fingerprint]}'
+                    for fingerprint, count in duplicates
+                )
+            )
+        response['Server-Timing'] = self.get_server_timing(
+            duration, profile, duplicates
+        )
+        return response
+
+    @staticmethod
+    def get_server_timing(duration, profile, duplicates):
+        metrics = [
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={profile.sql_time * 1000:.1f};'
+            f'desc="{profile.query_count} queries"',
+            f'serialize;dur={profile.serializer_time * 1000:.1f}',
+        ]
+        if duplicates:
+            description = ', '.join(
+                f'{count}x {fingerprint}' for fingerprint, count in duplicates
+            )
+            metrics.append(f'dupq;desc="{description}"')
+        return ', '.join(metrics)
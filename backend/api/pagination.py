@@ -1,4 +1,14 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.feed import get_feed_keys
 
 from .constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 
@@ -6,4 +16,147 @@ from .constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = 'limit'
-    max_page_size = MAX_PAGE_SIZE 
\ No newline at end of file
+    max_page_size = MAX_PAGE_SIZE
+
+
+class OptionalCursorPagination(CustomPageNumberPagination):
+    """Постраничная пагинация с опциональным режимом курсора.
+
+    Передача параметра cursor (в первый раз пустого) включает keyset-
+    пагинацию по полям cursor_ordering представления: страница ищется
+    условием WHERE по последней записи предыдущей, без OFFSET и без
+    COUNT(*). Общее количество считается только по запросу count=true.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    cursor_ordering = ('-created', '-id')
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = (
+            *self.get_rank_ordering(queryset),
+            *getattr(view, 'cursor_ordering', self.cursor_ordering),
+        )
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'true':
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.get_seek_filter(position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page_results = results[:page_size]
+        return self.page_results
+
+    @staticmethod
+    def get_rank_ordering(queryset):
+        """Сортировка по аннотациям-рангам, заданная фильтрами.
+
+        Поиск и подбор по продуктам упорядочивают выдачу по рангу; в
+        режиме курсора ранг становится старшей частью ключа, иначе
+        порядок выдачи потерялся бы.
+        """
+        return tuple(
+            field for field in queryset.query.order_by
+            if isinstance(field, str)
+            and field.lstrip('-') in queryset.query.annotations
+        )
+
+    def get_seek_filter(self, position):
+        """Условие «строго после position» для составного ключа сортировки."""
+        seek = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            seek |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return seek
+
+    def encode_cursor(self, instance):
+        position = [
+            getattr(instance, field.lstrip('-')) for field in self.ordering
+        ]
+        return base64.urlsafe_b64encode(
+            json.dumps(position, default=lambda value: value.isoformat())
+            .encode()
+        ).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page_results[-1])
+        )
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class FeedPagination(OptionalCursorPagination):
+    """Keyset-пагинация ленты подписок, собранной из нескольких источников.
+
+    Всегда работает в режиме курсора: ключи страницы берутся из
+    recipes.feed.get_feed_keys, а рецепты догружаются одним запросом.
+    """
+
+    def paginate_feed(self, queryset, request):
+        self.cursor_mode = True
+        self.request = request
+        self.ordering = self.cursor_ordering
+        self.count = None
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        page_size = self.get_page_size(request)
+        try:
+            keys = get_feed_keys(request.user, position, page_size + 1)
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        self.has_next = len(keys) > page_size
+        recipe_ids = [recipe_id for _, recipe_id in keys[:page_size]]
+        recipes = queryset.in_bulk(recipe_ids)
+        self.page_results = [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+        return self.page_results
@@ -0,0 +1,43 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class ShoppingListRenderer(JSONRenderer):
+    """Описывает формат файла списка покупок для выбора по ?format=.
+
+    Сам файл отдаётся потоком через StreamingHttpResponse, через render()
+    проходят только ответы с ошибками.
+    """
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain; charset=utf-8'
+    format = 'txt'
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv; charset=utf-8'
+    format = 'csv'
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class FormatParamContentNegotiation(BaseContentNegotiation):
+    """Выбирает рендерер только по ?format=, игнорируя заголовок Accept."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query = format_suffix or request.query_params.get(
+            api_settings.URL_FORMAT_OVERRIDE
+        )
+        for renderer in renderers:
+            if not format_query or renderer.format == format_query:
+                return renderer, renderer.media_type
+        raise NotFound(f'Формат {format_query} не поддерживается.')
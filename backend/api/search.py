@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from recipes.models import Ingredient
+
+from .indexes import ingredient_index, recipe_ingredient_index
+from .serializers import IngredientSerializer
+
+
+def search_ingredients(query, limit=None):
+    """Поиск ингредиентов, ранжированный по качеству совпадения.
+
+    Сначала совпадения с началом названия, затем с началом любого слова,
+    затем нечёткие совпадения по триграммам. На PostgreSQL запрос идёт
+    через pg_trgm и GIN-индексы, на остальных СУБД — через индекс
+    в памяти процесса.
+    """
+    if limit is None:
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+    if connection.vendor != 'postgresql':
+        return ingredient_index.search_ranked(query, limit)
+
+    query = query.strip()
+    ingredients = Ingredient.objects.annotate(
+        rank=Case(
+            When(name__istartswith=query, then=Value(0)),
+            When(name__icontains=f' {query}', then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        ),
+        similarity=TrigramWordSimilarity(query, 'name'),
+    ).filter(
+        Q(name__icontains=query) | Q(name__trigram_word_similar=query)
+    ).order_by('rank', '-similarity', 'name')[:limit]
+    return IngredientSerializer(ingredients, many=True).data
+
+
+def get_pantry(request):
+    """Множество id ингредиентов из параметра pantry или None."""
+    value = request.query_params.get('pantry')
+    if not value:
+        return None
+    return {int(item) for item in value.split(',') if item.isdigit()}
+
+
+def search_by_pantry(queryset, pantry, max_missing=None):
+    """Рецепты, которые можно приготовить из pantry, от самых полных.
+
+    Кандидаты ранжируются по инвертированному индексу в памяти, без
+    соединений с recipes_recipeingredient; в выборку попадают не больше
+    PANTRY_SEARCH_LIMIT лучших. Рецепты с одинаковым покрытием
+    получают общий ранг, поэтому CASE растёт с числом групп, а не
+    рецептов.
+    """
+    ranked = recipe_ingredient_index.rank(
+        pantry, max_missing, settings.PANTRY_SEARCH_LIMIT
+    )
+    if not ranked:
+        return queryset.none()
+    groups = {}
+    for missing, have, recipe_id in ranked:
+        groups.setdefault((missing, have), []).append(recipe_id)
+    return queryset.filter(
+        id__in=[recipe_id for _, _, recipe_id in ranked]
+    ).annotate(
+        pantry_rank=Case(
+            *(
+                When(id__in=recipe_ids, then=Value(position))
+                for position, recipe_ids in enumerate(groups.values())
+            ),
+            output_field=IntegerField(),
+        )
+    ).order_by('pantry_rank', '-id')
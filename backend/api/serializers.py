@@ -1,12 +1,10 @@
-import base64
-import uuid
-
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
+from recipes.fulltext import update_search_index
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -14,21 +12,15 @@ from recipes.models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from recipes.shopping_list import update_recipe_in_shopping_lists
 from users.models import Subscription
 
-User = get_user_model()
-
+from .fields import Base64ImageField
+from .images import get_variant_urls
+from .metrics import ProfiledSerializerMixin
+from .utils import get_recipes_limit
 
-class Base64ImageField(serializers.ImageField):
-    def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(
-                base64.b64decode(imgstr), 
-                name=f'{uuid.uuid4()}.{ext}'
-            )
-        return super().to_internal_value(data)
+User = get_user_model()
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -39,31 +31,52 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(ProfiledSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.ImageField(read_only=True)
+    avatar_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name', 
-            'is_subscribed', 'avatar'
+            'is_subscribed', 'avatar', 'avatar_variants'
         )
     
+    def get_subscribed_author_ids(self):
+        """Множество id авторов, на которых подписан текущий пользователь.
+
+        Загружается одним запросом и хранится в контексте корневого
+        сериализатора, поэтому общий для всех вложенных сериализаторов.
+        """
+        if 'subscribed_author_ids' not in self.context:
+            request = self.context.get('request')
+            author_ids = set()
+            if request and request.user.is_authenticated:
+                author_ids = set(
+                    Subscription.objects.filter(
+                        user=request.user
+                    ).values_list('author_id', flat=True)
+                )
+            self.context['subscribed_author_ids'] = author_ids
+        return self.context['subscribed_author_ids']
+    
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Subscription.objects.filter(
-                user=request.user, author=obj
-            ).exists()
-        return False
+        return obj.id in self.get_subscribed_author_ids()
+    
+    def get_avatar_variants(self, obj):
+        return get_variant_urls(
+            obj.avatar, obj.avatar_variants_source, self.context.get('request')
+        )
 
 
 class SetAvatarSerializer(serializers.Serializer):
     avatar = Base64ImageField()
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -87,13 +100,30 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+class RecipeImageVariantsMixin(serializers.Serializer):
+    image_variants = serializers.SerializerMethodField()
+    
+    def get_image_variants(self, obj):
+        return get_variant_urls(
+            obj.image, obj.image_variants_source, self.context.get('request')
+        )
+
+
+class RecipeMinifiedSerializer(
+    ProfiledSerializerMixin,
+    RecipeImageVariantsMixin,
+    serializers.ModelSerializer
+):
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(
+    ProfiledSerializerMixin,
+    RecipeImageVariantsMixin,
+    serializers.ModelSerializer
+):
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredients', many=True, read_only=True
@@ -105,24 +135,36 @@ class RecipeListSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
     
-    def get_is_favorited(self, obj):
+    def _get_user_flag(self, obj, name, model_class):
+        """Флаг из аннотации queryset, иначе отдельный запрос к model_class."""
+        if hasattr(obj, name):
+            return getattr(obj, name)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return Favorite.objects.filter(
+            return model_class.objects.filter(
                 user=request.user, recipe=obj
             ).exists()
         return False
     
+    def get_is_favorited(self, obj):
+        return self._get_user_flag(obj, 'is_favorited', Favorite)
+    
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return ShoppingCart.objects.filter(
-                user=request.user, recipe=obj
-            ).exists()
-        return False
+        return self._get_user_flag(obj, 'is_in_shopping_cart', ShoppingCart)
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        pantry = self.context.get('pantry')
+        if pantry is not None:
+            data['missing_ingredients'] = [
+                ingredient['id'] for ingredient in data['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+        return data
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -186,33 +228,93 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return value
     
     def create_ingredients(self, recipe, ingredients):
-        recipe_ingredients = []
-        for ingredient_data in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=ingredient_data['id'])
-            recipe_ingredients.append(
-                RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    amount=ingredient_data['amount']
-                )
+        # Существование ингредиентов уже проверено в validate_ingredients,
+        # поэтому строки создаются по ingredient_id без повторных SELECT.
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_data['id'],
+                amount=ingredient_data['amount']
             )
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            for ingredient_data in ingredients
+        ])
     
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        self.create_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self.create_ingredients(recipe, ingredients)
+            update_search_index([recipe.id])
         return recipe
     
+    def update_ingredients(self, recipe, ingredients):
+        """Приводит состав рецепта к ingredients, меняя только разницу.
+
+        Возвращает прежние количества {ingredient_id: amount}.
+        """
+        stored = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        submitted = {item['id']: item['amount'] for item in ingredients}
+        old_amounts = {
+            ingredient_id: recipe_ingredient.amount
+            for ingredient_id, recipe_ingredient in stored.items()
+        }
+
+        removed_ids = [
+            recipe_ingredient.id
+            for ingredient_id, recipe_ingredient in stored.items()
+            if ingredient_id not in submitted
+        ]
+        changed = []
+        for ingredient_id, recipe_ingredient in stored.items():
+            amount = submitted.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        added = [
+            item for item in ingredients if item['id'] not in stored
+        ]
+
+        if removed_ids:
+            RecipeIngredient.objects.filter(id__in=removed_ids).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            self.create_ingredients(recipe, added)
+        return old_amounts
+    
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
         
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
-        
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            old_amounts = self.update_ingredients(instance, ingredients)
+            new_amounts = {item['id']: item['amount'] for item in ingredients}
+            ingredients_changed = old_amounts != new_amounts
+            if ingredients_changed:
+                update_recipe_in_shopping_lists(
+                    instance.id, old_amounts, new_amounts
+                )
+            text_changed = any(
+                validated_data.get(field, getattr(instance, field))
+                != getattr(instance, field)
+                for field in ('name', 'text')
+            )
+            
+            instance = super().update(instance, validated_data)
+            if ingredients_changed or text_changed:
+                update_search_index([instance.id])
+        return instance
     
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
         return RecipeListSerializer(
             instance, context=self.context
         ).data
@@ -220,25 +322,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
 class UserWithRecipesSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.IntegerField(read_only=True, default=0)
+    recipes_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = User
         fields = (
             'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes', 'recipes_count', 'avatar'
+            'is_subscribed', 'recipes', 'recipes_count', 'avatar',
+            'avatar_variants'
         )
     
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = None
-
-        if request:
-            limit_param = request.query_params.get('recipes_limit')
-            if limit_param and limit_param.isdigit():
-                recipes_limit = int(limit_param)
+        recipes_limit = get_recipes_limit(self.context.get('request'))
 
-        recipes = obj.recipes.all()
+        recipes = getattr(obj, 'prefetched_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
         if recipes_limit is not None:
             recipes = recipes[:recipes_limit]
 
@@ -255,8 +354,8 @@ class RecipeShortLinkSerializer(serializers.ModelSerializer):
     def get_short_link(self, obj):
         request = self.context.get('request')
         if request:
-            return request.build_absolute_uri(f'/s/{obj.short_link}/')
-        return f'/s/{obj.short_link}/'
+            return request.build_absolute_uri(f'/s/{obj.short_code}/')
+        return f'/s/{obj.short_code}/'
     
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -0,0 +1,97 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import Ingredient, Recipe
+
+from .cache import invalidate_tags
+from .images import schedule_variants
+
+User = get_user_model()
+
+
+def invalidate_on_commit(*tags):
+    transaction.on_commit(lambda: invalidate_tags(*tags))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    invalidate_on_commit(
+        'recipes', f'recipe:{instance.pk}', f'author:{instance.author_id}'
+    )
+
+
+def mark_variants_ready(model, pk, field, name, *tags):
+    """Отмечает, что варианты картинки name готовы, и сбрасывает теги.
+
+    Метка ставится, только если у объекта всё ещё эта картинка и она
+    ещё не отмечена; updated обновляется в обход save(), чтобы сменился
+    ETag.
+    """
+    source_field = f'{field}_variants_source'
+    marked = model.objects.filter(
+        pk=pk, **{field: name}
+    ).exclude(
+        **{source_field: name}
+    ).update(**{source_field: name, 'updated': timezone.now()})
+    if marked:
+        invalidate_tags(*tags)
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(sender, instance, **kwargs):
+    # Готовые варианты меняют ссылки в ответах, которые уже могли
+    # закэшировать сервер и клиенты.
+    schedule_variants(
+        instance.image.name,
+        partial(
+            mark_variants_ready, Recipe, instance.pk, 'image',
+            instance.image.name, 'recipes', f'recipe:{instance.pk}'
+        )
+    )
+
+
+def get_author_tags(user):
+    """Теги ответов с данными пользователя как автора рецептов.
+
+    Профиль попадает в закэшированные ответы только вместе с его
+    рецептами, поэтому у пользователя без рецептов тегов нет.
+    """
+    if not user.recipes_count:
+        return ()
+    return ('users', f'author:{user.pk}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author(sender, instance, created=False, update_fields=None,
+                      **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+    tags = get_author_tags(instance)
+    if tags:
+        invalidate_on_commit(*tags)
+
+
+@receiver(post_save, sender=User)
+def process_avatar(sender, instance, update_fields=None, **kwargs):
+    if update_fields and 'avatar' not in update_fields:
+        return
+    schedule_variants(
+        instance.avatar.name,
+        partial(
+            mark_variants_ready, User, instance.pk, 'avatar',
+            instance.avatar.name, *get_author_tags(instance)
+        )
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, instance, **kwargs):
+    invalidate_on_commit('ingredients')
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def get_content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем sha256 их содержимого.
+
+    Каталог из upload_to и расширение сохраняются, а сам файл
+    записывается, только если такого содержимого ещё нет, поэтому
+    повторная загрузка той же картинки не создаёт новый файл. Файлы
+    не удаляются при замене: на один файл может ссылаться несколько
+    записей, а осиротевшие файлы удаляет команда collect_media.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(
+            directory, f'{get_content_hash(content)}{extension}'
+        )
+        if self.exists(name):
+            # collect_media судит о файлах по mtime: повторно
+            # использованный файл не должен выглядеть старым сиротой,
+            # пока ссылающаяся на него транзакция не зафиксирована.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length)
+
+
+content_storage = ContentAddressedStorage()
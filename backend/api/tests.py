@@ -0,0 +1,811 @@
+import base64
+import csv
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO
+from unittest import mock, skipIf
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient, APITestCase
+
+from recipes import recommendations
+from recipes.fulltext import update_search_index
+from recipes.transfer import RecipeImporter, parse_record
+from recipes.models import (
+    Favorite,
+    FeedItem,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingListItem,
+    SimilarRecipe,
+)
+from users.models import User
+
+from . import indexes
+from .fields import Base64ImageField, DecodedTemporaryFile
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAQMAAAAl21bKAAAA'
+    'A1BMVEUAAACnej3aAAAAAXRSTlMAQObYZgAAAApJREFUCNdjYAAAAAIAAeIhvDMAAAAAS'
+    'UVORK5CYII='
+)
+
+# Поисковый индекс: UPDATE tsvector на PostgreSQL, DELETE и INSERT в
+# FTS5-таблицу на SQLite.
+SEARCH_INDEX_QUERIES = 2 if connection.vendor == 'sqlite' else 1
+CREATE_QUERIES = 13 + SEARCH_INDEX_QUERIES
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, IMAGE_PROCESSING_WORKERS=0)
+class RecipeAPITestCase(APITestCase):
+    """Автор, ингредиенты и recipes_count его рецептов по 3 ингредиента."""
+
+    recipes_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='cook@example.com',
+            username='cook',
+            first_name='Иван',
+            last_name='Поваров',
+            password='secret-password',
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(30)
+        )
+        cls.recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.user,
+                name=f'Рецепт {number}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            for number in range(cls.recipes_count)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in cls.recipes
+            for ingredient in cls.ingredients[:3]
+        )
+        cls.recipe = cls.recipes[0]
+        cls.user.recipes_count = cls.recipes_count
+        cls.user.save(update_fields=['recipes_count'])
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get_payload(self, ingredients_count):
+        return {
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': IMAGE,
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:ingredients_count]
+            ],
+        }
+
+
+class RecipeQueryCountTest(RecipeAPITestCase):
+    """Число запросов не зависит от размера страницы и состава рецепта."""
+
+    recipes_count = 100
+
+    def test_list(self):
+        for limit in (6, 100):
+            with self.subTest(limit=limit), self.assertNumQueries(5):
+                response = self.client.get(f'/api/recipes/?limit={limit}')
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_detail(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        with self.assertNumQueries(CREATE_QUERIES):
+            response = self.client.post(
+                '/api/recipes/', self.get_payload(3), format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_create_does_not_depend_on_ingredients_count(self):
+        for count in (1, 5, 30):
+            with self.subTest(ingredients=count):
+                with self.assertNumQueries(CREATE_QUERIES):
+                    response = self.client.post(
+                        '/api/recipes/', self.get_payload(count),
+                        format='json',
+                    )
+                self.assertEqual(response.status_code, 201)
+                self.assertEqual(len(response.data['ingredients']), count)
+
+    def test_update_with_same_ingredients_does_not_write_them(self):
+        payload = self.get_payload(0)
+        payload['ingredients'] = [
+            {'id': ingredient.id, 'amount': 5}
+            for ingredient in self.ingredients[:3]
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if 'recipes_recipeingredient' in query['sql']
+            and query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(writes, [])
+
+
+class ResponseCacheInvalidationTest(RecipeAPITestCase):
+    """Запись в базу сбрасывает закэшированные ответы анониму."""
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+        self.list_url = '/api/recipes/'
+        self.detail_url = f'/api/recipes/{self.recipe.id}/'
+
+    def get_cached(self, url, expected):
+        response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], expected)
+        return response
+
+    def warm_up(self):
+        for url in (self.list_url, self.detail_url):
+            self.get_cached(url, 'MISS')
+            self.get_cached(url, 'HIT')
+
+    def test_recipe_update(self):
+        payload = self.get_payload(2)
+        # Первая правка заменяет картинку; готовые варианты сами
+        # сбрасывают кэш, поэтому проверяется вторая правка.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.detail_url, payload, format='json')
+        self.warm_up()
+        payload['name'] = 'Обновлённый рецепт'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                self.detail_url, payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        response = self.get_cached(self.detail_url, 'MISS')
+        self.assertEqual(response.data['name'], 'Обновлённый рецепт')
+        self.assertEqual(len(response.data['ingredients']), 2)
+        response = self.get_cached(self.list_url, 'MISS')
+        self.assertIn(
+            'Обновлённый рецепт',
+            [recipe['name'] for recipe in response.data['results']],
+        )
+
+    def test_recipe_delete(self):
+        self.warm_up()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.detail_url)
+        self.assertEqual(response.status_code, 204)
+        response = self.get_cached(self.list_url, 'MISS')
+        self.assertEqual(response.data['count'], self.recipes_count - 1)
+        self.assertEqual(self.anonymous.get(self.detail_url).status_code, 404)
+
+    def test_ingredient_rename(self):
+        self.warm_up()
+        etag = self.anonymous.get(self.detail_url)['ETag']
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Соль морская'
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        for url in (self.detail_url, self.list_url):
+            self.get_cached(url, 'MISS')
+        response = self.get_cached(self.detail_url, 'HIT')
+        self.assertIn(
+            'Соль морская',
+            [item['name'] for item in response.data['ingredients']],
+        )
+        response = self.anonymous.get(
+            self.detail_url, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_author_update(self):
+        self.warm_up()
+        etag = self.anonymous.get(self.list_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': IMAGE}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        for url in (self.detail_url, self.list_url):
+            self.get_cached(url, 'MISS')
+        response = self.anonymous.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_users_without_recipes_keep_cache(self):
+        self.warm_up()
+        etag = self.anonymous.get(self.list_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.anonymous.post('/api/users/', {
+                'email': 'newcomer@example.com',
+                'username': 'newcomer',
+                'first_name': 'Олег',
+                'last_name': 'Новиков',
+                'password': 'secret-password-42',
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        newcomer = User.objects.get(username='newcomer')
+        self.client.force_authenticate(newcomer)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                '/api/users/me/avatar/', {'avatar': IMAGE}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        for url in (self.detail_url, self.list_url):
+            self.get_cached(url, 'HIT')
+        response = self.anonymous.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class CursorPaginationTest(RecipeAPITestCase):
+    """Курсор проходит выдачу без пропусков и повторов, даже при равных
+    датах создания, а испорченный курсор даёт 404."""
+
+    recipes_count = 7
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Рецепты создаются парами в одну секунду, а в описании разное
+        # число слов «суп», чтобы у поиска были разные ранги.
+        created = timezone.now()
+        for number, recipe in enumerate(cls.recipes):
+            recipe.created = created - timedelta(seconds=number // 2)
+            recipe.text = ' '.join(['суп'] * (number % 3 + 1))
+        Recipe.objects.bulk_update(cls.recipes, ['created', 'text'])
+        update_search_index()
+        cls.reader = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Пётр',
+            last_name='Читателев',
+            password='secret-password',
+        )
+
+    @staticmethod
+    def encode(position):
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()
+        ).decode()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_recipes_order_with_equal_created(self):
+        expected = list(
+            Recipe.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        for limit in (1, 2, 3):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    self.walk(f'/api/recipes/?cursor=&limit={limit}'),
+                    expected,
+                )
+
+    def test_search_keeps_rank_order(self):
+        search = '/api/recipes/?search=%D1%81%D1%83%D0%BF'
+        expected = self.walk(f'{search}&limit=100')
+        self.assertEqual(len(expected), self.recipes_count)
+        self.assertEqual(self.walk(f'{search}&cursor=&limit=2'), expected)
+
+    def test_feed_order_with_equal_created(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        expected = list(
+            Recipe.objects.order_by('-created', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        self.assertEqual(
+            self.walk('/api/recipes/feed/?limit=2'), expected
+        )
+
+    def test_invalid_cursor(self):
+        cursors = (
+            'не-base64',
+            self.encode({'created': 1}),
+            self.encode([1]),
+            self.encode(['вчера', 1]),
+            self.encode([None, 'x']),
+        )
+        for cursor in cursors:
+            for url in ('/api/recipes/', '/api/recipes/feed/'):
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+
+
+class ShoppingListTest(RecipeAPITestCase):
+    """Выгруженный список покупок совпадает с суммой по корзине."""
+
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.shoppers = [
+            User.objects.create_user(
+                email=f'shopper{number}@example.com',
+                username=f'shopper{number}',
+                first_name='Анна',
+                last_name='Покупкина',
+                password='secret-password',
+            )
+            for number in range(2)
+        ]
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def add_to_carts(self, *recipes):
+        for shopper in self.shoppers:
+            client = self.get_client(shopper)
+            for recipe in recipes:
+                response = client.post(
+                    f'/api/recipes/{recipe.id}/shopping_cart/'
+                )
+                self.assertEqual(response.status_code, 201)
+
+    def get_downloaded(self, user):
+        response = self.get_client(user).get(
+            '/api/recipes/download_shopping_cart/', {'format': 'csv'}
+        )
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(content.splitlines()))[1:]
+        return {(name, unit): int(amount) for name, amount, unit in rows}
+
+    def get_expected(self, user):
+        return {
+            (row['ingredient__name'], row['ingredient__measurement_unit']):
+                row['total']
+            for row in RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            ).values(
+                'ingredient__name', 'ingredient__measurement_unit'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+
+    def assert_shopping_lists(self):
+        for shopper in self.shoppers:
+            with self.subTest(shopper=shopper.username):
+                self.assertEqual(
+                    self.get_downloaded(shopper), self.get_expected(shopper)
+                )
+
+    def test_cart_add_and_remove(self):
+        self.add_to_carts(*self.recipes[:2])
+        self.assert_shopping_lists()
+        client = self.get_client(self.shoppers[0])
+        for recipe in self.recipes[:2]:
+            response = client.delete(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+            self.assertEqual(response.status_code, 204)
+            self.assert_shopping_lists()
+        self.assertEqual(self.get_downloaded(self.shoppers[0]), {})
+
+    def test_recipe_ingredients_update(self):
+        self.add_to_carts(*self.recipes[:2])
+        payload = self.get_payload(0)
+        # Первый ингредиент убран, у второго другое количество, а
+        # четвёртый добавлен.
+        payload['ingredients'] = [
+            {'id': self.ingredients[1].id, 'amount': 7},
+            {'id': self.ingredients[2].id, 'amount': 5},
+            {'id': self.ingredients[3].id, 'amount': 4},
+        ]
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', payload, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_shopping_lists()
+
+    def test_recipe_delete(self):
+        self.add_to_carts(*self.recipes[:2])
+        response = self.client.delete(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_lists()
+
+    def test_author_delete(self):
+        self.add_to_carts(*self.recipes[:2])
+        response = self.client.delete(
+            '/api/users/me/',
+            {'current_password': 'secret-password'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_shopping_lists()
+        self.assertEqual(self.get_downloaded(self.shoppers[0]), {})
+
+    def test_migration_backfill(self):
+        self.add_to_carts(*self.recipes)
+        ShoppingListItem.objects.all().delete()
+        migration = import_module(
+            'recipes.migrations.0009_shopping_list_item'
+        )
+        migration.fill_shopping_lists(apps, None)
+        self.assert_shopping_lists()
+
+
+def make_png(width, height):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def to_data_url(content, line_length=None, separator='\n'):
+    encoded = base64.b64encode(content).decode()
+    if line_length:
+        encoded = separator.join(
+            encoded[start:start + line_length]
+            for start in range(0, len(encoded), line_length)
+        )
+    return f'data:image/png;base64,{encoded}'
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Порционное декодирование и ограничения Base64ImageField."""
+
+    def setUp(self):
+        self.field = Base64ImageField()
+
+    def assert_fails(self, data, code):
+        with self.assertRaises(ValidationError) as context:
+            self.field.to_internal_value(data)
+        self.assertEqual(context.exception.detail[0].code, code)
+
+    def test_decodes_wrapped_input(self):
+        content = make_png(40, 30)
+        wrapped = (
+            to_data_url(content, 76),
+            to_data_url(content, 64, '\r\n'),
+            to_data_url(content, 5, ' \t'),
+        )
+        # Порция в 7 символов не кратна 4 и рвёт группы base64.
+        for chunk_size in (7, 64 * 1024):
+            for data in wrapped:
+                with self.subTest(chunk_size=chunk_size, data=data[:40]):
+                    with mock.patch(
+                        'api.fields.DECODE_CHUNK_SIZE', chunk_size
+                    ):
+                        file = self.field.to_internal_value(data)
+                    self.assertEqual(file.read(), content)
+                    self.assertEqual(file.size, len(content))
+
+    def test_decodes_padded_input(self):
+        for length in range(1, 8):
+            content = bytes(range(length))
+            for data in (to_data_url(content), to_data_url(content, 2)):
+                with self.subTest(length=length, data=data):
+                    with mock.patch('api.fields.DECODE_CHUNK_SIZE', 3):
+                        file = self.field.decode(data)
+                    self.assertEqual(file.read(), content)
+
+    def test_rejects_invalid_base64(self):
+        for encoded in ('abc', 'ab$c', 'abcd a', 'ab=c'):
+            with self.subTest(encoded=encoded):
+                self.assert_fails(
+                    f'data:image/png;base64,{encoded}', 'invalid_base64'
+                )
+
+    def test_size_limit(self):
+        content = make_png(10, 10)
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=len(content)):
+            file = self.field.to_internal_value(to_data_url(content, 76))
+            self.assertEqual(file.read(), content)
+        with override_settings(IMAGE_UPLOAD_MAX_BYTES=len(content) - 1):
+            self.assert_fails(to_data_url(content, 76), 'too_large')
+
+    def test_large_input_goes_to_temporary_file(self):
+        content = make_png(40, 30)
+        with override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=100):
+            file = self.field.to_internal_value(to_data_url(content, 76))
+        self.assertIsInstance(file, DecodedTemporaryFile)
+        self.assertEqual(file.read(), content)
+
+    def test_pixel_limit(self):
+        data = to_data_url(make_png(10, 10))
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=100):
+            self.field.to_internal_value(data)
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=99):
+            self.assert_fails(data, 'too_many_pixels')
+        # Pillow сам отказывается открывать огромные изображения.
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 10):
+            self.assert_fails(data, 'too_many_pixels')
+
+
+@override_settings(FEED_FANOUT_MAX_SUBSCRIBERS=2)
+class FeedThresholdTest(RecipeAPITestCase):
+    """Рецепты не пропадают из лент, когда автор пересекает порог."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.readers = [
+            User.objects.create_user(
+                email=f'reader{number}@example.com',
+                username=f'reader{number}',
+                first_name='Пётр',
+                last_name='Читателев',
+                password='secret-password',
+            )
+            for number in range(3)
+        ]
+
+    def get_client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def subscribe(self, reader, method='post'):
+        response = getattr(self.get_client(reader), method)(
+            f'/api/users/{self.user.id}/subscribe/'
+        )
+        self.assertIn(response.status_code, (201, 204))
+
+    def get_feed_ids(self, reader):
+        response = self.get_client(reader).get(
+            '/api/recipes/feed/', {'limit': 100}
+        )
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def create_recipe(self):
+        response = self.client.post(
+            '/api/recipes/', self.get_payload(2), format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def test_subscriber_above_threshold_gets_no_items(self):
+        for reader in self.readers:
+            self.subscribe(reader)
+        self.assertFalse(
+            FeedItem.objects.filter(user=self.readers[2]).exists()
+        )
+        self.assertEqual(
+            len(self.get_feed_ids(self.readers[2])), self.recipes_count
+        )
+
+    def test_recipes_stay_after_author_drops_to_threshold(self):
+        for reader in self.readers:
+            self.subscribe(reader)
+        recipe_id = self.create_recipe()
+        self.assertFalse(FeedItem.objects.filter(recipe_id=recipe_id))
+        self.subscribe(self.readers[2], 'delete')
+        for reader in self.readers[:2]:
+            with self.subTest(reader=reader.username):
+                self.assertEqual(self.get_feed_ids(reader)[0], recipe_id)
+        self.assertEqual(self.get_feed_ids(self.readers[2]), [])
+
+    def test_recipes_stay_after_follower_deleted(self):
+        for reader in self.readers:
+            self.subscribe(reader)
+        recipe_id = self.create_recipe()
+        response = self.get_client(self.readers[2]).delete(
+            '/api/users/me/',
+            {'current_password': 'secret-password'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+        for reader in self.readers[:2]:
+            with self.subTest(reader=reader.username):
+                self.assertEqual(self.get_feed_ids(reader)[0], recipe_id)
+
+
+class RecipeImportTest(RecipeAPITestCase):
+    """Импорт считает только созданные ингредиенты и наполняет ленты."""
+
+    def get_record(self, *ingredient_names):
+        return parse_record({
+            'author': {
+                'email': self.user.email,
+                'username': self.user.username,
+                'first_name': self.user.first_name,
+                'last_name': self.user.last_name,
+            },
+            'name': 'Импортированный рецепт',
+            'text': 'Описание',
+            'cooking_time': 20,
+            'image': 'recipes/images/recipe.png',
+            'ingredients': [
+                {'name': name, 'measurement_unit': 'г', 'amount': 5}
+                for name in ingredient_names
+            ],
+        })
+
+    def test_created_ingredients_skip_existing(self):
+        importer = RecipeImporter()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        imported, errors = importer.import_batch(
+            [self.get_record('Соль', 'Перец')]
+        )
+        self.assertEqual((imported, errors), (1, []))
+        self.assertEqual(importer.created_ingredients, 1)
+
+    def test_imported_recipes_reach_feeds(self):
+        reader = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Пётр',
+            last_name='Читателев',
+            password='secret-password',
+        )
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = client.post(f'/api/users/{self.user.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        importer = RecipeImporter()
+        importer.import_batch([self.get_record(self.ingredients[0].name)])
+        importer.finish()
+        recipe = Recipe.objects.get(name='Импортированный рецепт')
+        self.assertTrue(
+            FeedItem.objects.filter(user=reader, recipe=recipe).exists()
+        )
+
+
+class RecommendationsTest(RecipeAPITestCase):
+    """Пересчёт рекомендаций переживает рецепты, созданные по ходу."""
+
+    recipes_count = 4
+
+    def test_recipe_created_during_build(self):
+        reader = User.objects.create_user(
+            email='reader@example.com',
+            username='reader',
+            first_name='Пётр',
+            last_name='Читателев',
+            password='secret-password',
+        )
+        Favorite.objects.bulk_create(
+            Favorite(user=reader, recipe=recipe)
+            for recipe in self.recipes[:2]
+        )
+        get_vectors = recommendations.get_vectors
+        created = []
+
+        def get_vectors_after_create(pairs, positions):
+            # Рецепт появляется между чтением авторов и чтением пар.
+            if not created:
+                recipe = Recipe.objects.create(
+                    author=reader,
+                    name='Поздний рецепт',
+                    text='Описание',
+                    cooking_time=10,
+                    image='recipes/images/recipe.png',
+                )
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=self.ingredients[0], amount=1
+                )
+                Favorite.objects.create(user=reader, recipe=recipe)
+                created.append(recipe)
+            return get_vectors(pairs, positions)
+
+        with mock.patch.object(
+            recommendations, 'get_vectors', get_vectors_after_create
+        ):
+            recommendations.build_recommendations()
+        self.assertTrue(SimilarRecipe.objects.exists())
+        self.assertFalse(
+            SimilarRecipe.objects.filter(similar=created[0]).exists()
+        )
+
+
+class PantryIndexTest(RecipeAPITestCase):
+    """Подбор по продуктам: ранжирование и версия индекса в кэше."""
+
+    recipes_count = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        RecipeIngredient.objects.create(
+            recipe=cls.recipes[1], ingredient=cls.ingredients[3], amount=1
+        )
+        RecipeIngredient.objects.filter(
+            recipe=cls.recipes[2], ingredient=cls.ingredients[2]
+        ).delete()
+
+    def setUp(self):
+        super().setUp()
+        # Часы индекса под контролем теста: сдвиг за
+        # PANTRY_INDEX_MAX_STALENESS разрешает перестройку.
+        self.clock = 10.0 ** 9
+        patcher = mock.patch.object(
+            indexes, 'monotonic', lambda: self.clock
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_expected(self):
+        first, second, third = (recipe.id for recipe in self.recipes)
+        return [(0, 3, first), (0, 2, third), (1, 3, second)]
+
+    def rank_all_ways(self, index):
+        pantry = [ingredient.id for ingredient in self.ingredients[:3]]
+        expected = self.get_expected()
+        self.assertEqual(index.rank(pantry), expected)
+        self.assertEqual(index.rank(pantry, max_missing=0), expected[:2])
+        self.assertEqual(index.rank(pantry, limit=1), expected[:1])
+        self.assertEqual(index.rank([self.ingredients[10].id]), [])
+
+    def test_rank_without_numpy(self):
+        with mock.patch.object(indexes, 'numpy', None):
+            self.rank_all_ways(indexes.RecipeIngredientIndex())
+
+    @skipIf(indexes.numpy is None, 'NumPy не установлен')
+    def test_rank_with_numpy(self):
+        self.rank_all_ways(indexes.RecipeIngredientIndex())
+
+    def test_stale_index_is_not_cached_as_current(self):
+        anonymous = APIClient()
+        url = f'/api/recipes/?pantry={self.ingredients[3].id}'
+
+        def get_ids(expected_cache):
+            response = anonymous.get(url)
+            self.assertEqual(response['X-Cache'], expected_cache)
+            ids = [recipe['id'] for recipe in response.data['results']]
+            return ids, response['ETag']
+
+        self.assertEqual(get_ids('MISS')[0], [self.recipes[1].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/', self.get_payload(4), format='json'
+            )
+        new_id = response.data['id']
+        # Индекс ещё не перестроен: ответ устаревший, но записан с
+        # версией индекса, а не с текущей версией тега recipes.
+        stale_ids, stale_etag = get_ids('MISS')
+        self.assertEqual(stale_ids, [self.recipes[1].id])
+        self.clock += settings.PANTRY_INDEX_MAX_STALENESS + 1
+        ids, etag = get_ids('MISS')
+        self.assertEqual(ids, [new_id, self.recipes[1].id])
+        self.assertNotEqual(etag, stale_etag)
+        self.assertEqual(get_ids('HIT')[0], ids)
@@ -5,6 +5,7 @@ from .views import (
     CustomUserViewSet,
     IngredientViewSet,
     RecipeViewSet,
+    cache_stats,
 )
 
 app_name = 'api'
@@ -17,4 +18,5 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('cache/stats/', cache_stats, name='cache_stats'),
 ] 
\ No newline at end of file
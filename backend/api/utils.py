@@ -1,41 +1,122 @@
-import random
-import string
-from collections import defaultdict
+import csv
+from functools import lru_cache
 from io import BytesIO
 
 from django.conf import settings
 from django.db import models
-from django.http import HttpResponse
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
-from recipes.models import RecipeIngredient
+from recipes.models import ShoppingListItem
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 18
+PDF_MARGIN = 50
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def change_counter(queryset, field, delta=1):
+    """Атомарно изменяет счётчик field на delta, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: models.F(field) + delta})
+
+
+def get_recipes_limit(request):
+    """Значение query-параметра recipes_limit или None."""
+    if request is None:
+        return None
+    limit_param = request.query_params.get('recipes_limit')
+    if limit_param and limit_param.isdigit():
+        return int(limit_param)
+    return None
 
 
 def get_shopping_list_ingredients(user):
-    return RecipeIngredient.objects.filter(
-        recipe__shopping_cart__user=user
+    return ShoppingListItem.objects.filter(
+        user=user
     ).values(
         'ingredient__name',
-        'ingredient__measurement_unit'
-    ).annotate(
-        total_amount=models.Sum('amount')
+        'ingredient__measurement_unit',
+        'total_amount'
     ).order_by('ingredient__name')
 
 
-def generate_shopping_list_txt(user):
-    ingredients = get_shopping_list_ingredients(user)
-    
-    shopping_list = ['Список покупок:\n']
-    
+def format_shopping_list_line(ingredient):
+    return (
+        f"{ingredient['ingredient__name']} - "
+        f"{ingredient['total_amount']} "
+        f"{ingredient['ingredient__measurement_unit']}"
+    )
+
+
+def iter_shopping_list_txt(ingredients):
+    yield 'Список покупок:\n'
     for ingredient in ingredients:
-        shopping_list.append(
-            f"{ingredient['ingredient__name']} - "
-            f"{ingredient['total_amount']} "
-            f"{ingredient['ingredient__measurement_unit']}"
-        )
-    
-    return '\n'.join(shopping_list)
-    
\ No newline at end of file
+        yield f'\n{format_shopping_list_line(ingredient)}'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def iter_shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['Ингредиент', 'Количество', 'Единица измерения'])
+    for ingredient in ingredients:
+        yield writer.writerow([
+            ingredient['ingredient__name'],
+            ingredient['total_amount'],
+            ingredient['ingredient__measurement_unit'],
+        ])
+
+
+@lru_cache(maxsize=None)
+def register_pdf_font():
+    """Регистрирует шрифт с кириллицей один раз на процесс."""
+    pdfmetrics.registerFont(
+        TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+    )
+    return PDF_FONT_NAME
+
+
+def iter_shopping_list_pdf(ingredients):
+    """PDF со списком покупок, который отдаётся частями.
+
+    Строки берутся из итератора и рисуются постранично, так что список
+    ингредиентов целиком в памяти не собирается.
+    """
+    font_name = register_pdf_font()
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    width, height = A4
+    top = height - PDF_MARGIN
+
+    pdf.setFont(font_name, PDF_FONT_SIZE)
+    pdf.drawString(PDF_MARGIN, top, 'Список покупок:')
+    y = top - 2 * PDF_LINE_HEIGHT
+    for ingredient in ingredients:
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font_name, PDF_FONT_SIZE)
+            y = top
+        pdf.drawString(PDF_MARGIN, y, format_shopping_list_line(ingredient))
+        y -= PDF_LINE_HEIGHT
+    pdf.save()
+
+    content = buffer.getbuffer()
+    for start in range(0, len(content), STREAM_CHUNK_SIZE):
+        yield bytes(content[start:start + STREAM_CHUNK_SIZE])
+
+
+SHOPPING_LIST_GENERATORS = {
+    'txt': iter_shopping_list_txt,
+    'csv': iter_shopping_list_csv,
+    'pdf': iter_shopping_list_pdf,
+}
@@ -1,15 +1,33 @@
+from hmac import compare_digest
 from http import HTTPStatus
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.db.models import Count, Prefetch
-from django.http import HttpResponse
+from django.db import connection, transaction
+from django.db.models import (
+    BooleanField,
+    Exists,
+    OuterRef,
+    Prefetch,
+    Value,
+)
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import viewsets
-from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import (
+    IsAdminUser,
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 from rest_framework.response import Response
 
 from recipes.models import (
@@ -19,11 +37,41 @@ from recipes.models import (
     RecipeIngredient,
     ShoppingCart,
 )
+from recipes import short_codes
+from recipes.feed import (
+    add_author_to_feed,
+    backfill_returned_authors,
+    fan_out_recipe,
+    remove_author_from_feed,
+)
+from recipes.shopping_list import (
+    add_recipe_to_shopping_list,
+    get_recipe_amounts,
+    remove_recipe_from_shopping_list,
+    remove_recipes_from_shopping_lists,
+    update_recipe_in_shopping_lists,
+)
 from users.models import Subscription
 
+from .cache import (
+    AnonymousResponseCacheMixin,
+    get_cache_stats,
+    get_tag_versions,
+    resolve_legacy_short_code,
+)
+from .conditional import ConditionalGetMixin
+from .metrics import registry
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPageNumberPagination
+from .indexes import ingredient_index, recipe_ingredient_index
+from .pagination import FeedPagination, OptionalCursorPagination
 from .permissions import IsAuthorOrReadOnly
+from .renderers import (
+    CsvShoppingListRenderer,
+    FormatParamContentNegotiation,
+    PdfShoppingListRenderer,
+    TxtShoppingListRenderer,
+)
+from .search import get_pantry, search_ingredients
 from .serializers import (
     CustomUserSerializer,
     IngredientSerializer,
@@ -35,20 +83,81 @@ from .serializers import (
     SubscriptionSerializer,
     UserWithRecipesSerializer,
 )
-from .utils import generate_shopping_list_txt
+from .utils import (
+    SHOPPING_LIST_GENERATORS,
+    change_counter,
+    get_recipes_limit,
+    get_shopping_list_ingredients,
+)
 
 User = get_user_model()
 
+RECIPE_LIST_TAGS = ('recipes', 'ingredients', 'users')
+
 
 def short_link_redirect(request, short_code):
-    recipe = get_object_or_404(Recipe, short_link=short_code)
-    return redirect(f'/recipes/{recipe.id}/')
+    recipe_id = short_codes.decode(short_code)
+    if recipe_id is None:
+        recipe_id = resolve_legacy_short_code(short_code)
+    if recipe_id is None:
+        raise Http404
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response(get_cache_stats())
+
+
+def metrics_allowed(request):
+    """Запрос пришёл с адреса из METRICS_ALLOWED_IPS или с METRICS_TOKEN.
+
+    nginx не проксирует /metrics, поэтому REMOTE_ADDR — адрес
+    самого клиента, а не прокси.
+    """
+    if settings.METRICS_TOKEN and compare_digest(
+        request.headers.get('Authorization', '').encode(),
+        f'Bearer {settings.METRICS_TOKEN}'.encode(),
+    ):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    """Гистограммы запросов и статистика кэша в формате Prometheus."""
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    cache = get_cache_stats()
+    lines = [
+        '# HELP foodgram_response_cache_total Обращения к кэшу ответов',
+        '# TYPE foodgram_response_cache_total counter',
+        f'foodgram_response_cache_total{{result="hit"}} {cache["hits"]}',
+        f'foodgram_response_cache_total{{result="miss"}} {cache["misses"]}',
+    ]
+    return HttpResponse(
+        registry.render(lines),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
 
 
-class CustomUserViewSet(DjoserUserViewSet):
+def get_ingredients_version():
+    return get_tag_versions(['ingredients'])['ingredients']
+
+
+def parse_pk(value):
+    """Целый первичный ключ из URL или None, если это не число."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CustomUserViewSet(ConditionalGetMixin, DjoserUserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
-    pagination_class = CustomPageNumberPagination
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('id',)
     
     @action(
         detail=False,
@@ -63,7 +172,7 @@ class CustomUserViewSet(DjoserUserViewSet):
             serializer = SetAvatarSerializer(data=request.data)
             if serializer.is_valid():
                 user.avatar = serializer.validated_data['avatar']
-                user.save()
+                user.save(update_fields=['avatar', 'updated'])
                 return Response(
                     {'avatar': request.build_absolute_uri(user.avatar.url)},
                     status=HTTPStatus.OK
@@ -75,7 +184,10 @@ class CustomUserViewSet(DjoserUserViewSet):
         
         elif request.method == 'DELETE':
             if user.avatar:
-                user.avatar.delete()
+                # Файл может быть общим с другими записями, поэтому
+                # только снимаем ссылку; удалит его collect_media.
+                user.avatar = ''
+                user.save(update_fields=['avatar', 'updated'])
             return Response(status=HTTPStatus.NO_CONTENT)
     
     @action(
@@ -84,22 +196,42 @@ class CustomUserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         subscriptions = Subscription.objects.filter(user=request.user)
+        recipes = Recipe.objects.all()
+        recipes_limit = get_recipes_limit(request)
+        if (
+            recipes_limit is not None
+            and connection.features.supports_over_clause
+        ):
+            # ROW_NUMBER() OVER (PARTITION BY author_id) на стороне БД;
+            # без оконных функций срез делается в сериализаторе.
+            recipes = recipes[:recipes_limit]
         authors = User.objects.filter(
             id__in=subscriptions.values_list('author_id', flat=True)
-        ).annotate(recipes_count=Count('recipes'))
+        ).prefetch_related(
+            Prefetch(
+                'recipes', queryset=recipes, to_attr='prefetched_recipes'
+            )
+        ).order_by('id')
         
         page = self.paginate_queryset(authors)
         if page is not None:
             serializer = UserWithRecipesSerializer(
-                page, many=True, context={'request': request}
+                page, many=True, context=self._subscribed_context(page)
             )
             return self.get_paginated_response(serializer.data)
         
         serializer = UserWithRecipesSerializer(
-            authors, many=True, context={'request': request}
+            authors, many=True, context=self._subscribed_context(authors)
         )
         return Response(serializer.data)
     
+    def _subscribed_context(self, authors):
+        """Контекст для авторов, на которых пользователь точно подписан."""
+        return {
+            'request': self.request,
+            'subscribed_author_ids': {author.id for author in authors},
+        }
+    
     @action(
     detail=True,
     methods=['post', 'delete'],
@@ -114,18 +246,35 @@ class CustomUserViewSet(DjoserUserViewSet):
                 context={'request': request}
             )
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+                change_counter(
+                    User.objects.filter(pk=author.pk), 'subscribers_count'
+                )
+                author.refresh_from_db(fields=['subscribers_count'])
+                add_author_to_feed(request.user, author)
 
             return Response(
-                UserWithRecipesSerializer(author, context={'request': request}).data,
+                UserWithRecipesSerializer(
+                    author, context=self._subscribed_context([author])
+                ).data,
                 status=HTTPStatus.CREATED
             )
         
         elif request.method == 'DELETE':
-            deleted_count, _ = Subscription.objects.filter(
-                user=request.user,
-                author=author
-            ).delete()
+            with transaction.atomic():
+                deleted_count, _ = Subscription.objects.filter(
+                    user=request.user,
+                    author=author
+                ).delete()
+                if deleted_count:
+                    change_counter(
+                        User.objects.filter(pk=author.pk),
+                        'subscribers_count',
+                        -1
+                    )
+                    remove_author_from_feed(request.user, author)
+                    backfill_returned_authors([author.pk])
 
             if not deleted_count:
                 return Response(
@@ -135,6 +284,49 @@ class CustomUserViewSet(DjoserUserViewSet):
 
             return Response(status=HTTPStatus.NO_CONTENT)
 
+    def perform_destroy(self, instance):
+        """Удаление пользователя вместе с его вкладом в чужие счётчики."""
+        with transaction.atomic():
+            followed_ids = list(
+                User.objects.filter(
+                    subscribers__user=instance
+                ).values_list('pk', flat=True)
+            )
+            change_counter(
+                User.objects.filter(pk__in=followed_ids),
+                'subscribers_count',
+                -1
+            )
+            change_counter(
+                Recipe.objects.filter(favorites__user=instance),
+                'favorites_count',
+                -1
+            )
+            change_counter(
+                Recipe.objects.filter(shopping_cart__user=instance),
+                'in_cart_count',
+                -1
+            )
+            remove_recipes_from_shopping_lists(
+                Recipe.objects.filter(author=instance)
+            )
+            super().perform_destroy(instance)
+            backfill_returned_authors(followed_ids)
+
+    def get_object_version(self, request, *args, **kwargs):
+        if self.action == 'me':
+            user_id = request.user.pk
+        else:
+            user_id = parse_pk(kwargs.get(self.lookup_field))
+            if user_id is None:
+                return None
+        updated = User.objects.filter(
+            pk=user_id
+        ).values_list('updated', flat=True).first()
+        if updated is None:
+            return None
+        return (updated,), updated
+
     @action(detail=False, methods=['get', 'put', 'patch', 'delete'],
             permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
@@ -143,15 +335,48 @@ class CustomUserViewSet(DjoserUserViewSet):
         return super().me(request, *args, **kwargs)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientIndexListMixin:
+    """Отдаёт список и поиск ингредиентов из индекса в памяти процесса."""
+
+    def list(self, request, *args, **kwargs):
+        search = request.query_params.get('search')
+        if search:
+            return Response(search_ingredients(search))
+        if set(request.query_params) - {'name'}:
+            return super().list(request, *args, **kwargs)
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return Response(ingredient_index.all())
+
+
+class IngredientViewSet(
+    ConditionalGetMixin,
+    AnonymousResponseCacheMixin,
+    IngredientIndexListMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    cache_prefix = 'ingredients'
+    etag_depends_on_viewer = False
+    
+    def get_cache_base_tags(self):
+        return ['ingredients']
+    
+    def get_list_version(self, request):
+        return (get_ingredients_version(),), None
+    
+    def get_object_version(self, request, *args, **kwargs):
+        return (get_ingredients_version(),), None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin, AnonymousResponseCacheMixin, viewsets.ModelViewSet
+):
     queryset = Recipe.objects.select_related('author').prefetch_related(
         Prefetch(
             'recipe_ingredients',
@@ -161,15 +386,145 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    pagination_class = CustomPageNumberPagination
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('-created', '-id')
+    cache_prefix = 'recipes'
+    
+    def get_cache_base_tags(self):
+        # Ответ содержит названия и единицы ингредиентов.
+        if self.action == 'retrieve':
+            return [f'recipe:{self.kwargs[self.lookup_field]}', 'ingredients']
+        return ['recipes', 'ingredients']
+    
+    def get_cache_tags(self, data):
+        recipes = data['results'] if self.action == 'list' else [data]
+        return list({f"author:{recipe['author']['id']}" for recipe in recipes})
+    
+    def get_pantry_version(self):
+        """Версия индекса продуктов для подбора по продуктам, иначе ''.
+
+        Индекс отстаёт от тега recipes до PANTRY_INDEX_MAX_STALENESS
+        секунд, поэтому ответ по нему помечается версией самого индекса.
+        """
+        if self.action != 'list' or get_pantry(self.request) is None:
+            return ''
+        return recipe_ingredient_index.get_version()
+    
+    def get_cache_key_suffix(self):
+        return self.get_pantry_version()
+    
+    def get_list_version(self, request):
+        # Теги сбрасываются при любой записи рецептов, их состава,
+        # ингредиентов и профилей авторов, так что версия списка
+        # берётся из кэша без запросов к базе.
+        versions = get_tag_versions(RECIPE_LIST_TAGS)
+        return (
+            *(versions[tag] for tag in RECIPE_LIST_TAGS),
+            self.get_pantry_version(),
+        ), None
+    
+    def get_object_version(self, request, *args, **kwargs):
+        recipe_id = parse_pk(kwargs[self.lookup_field])
+        if recipe_id is None:
+            return None
+        row = Recipe.objects.filter(pk=recipe_id).values_list(
+            'updated', 'author__updated'
+        ).first()
+        if row is None:
+            return None
+        # Без Last-Modified: переименование ингредиента меняет ответ, не
+        # трогая меток updated, и If-Modified-Since дал бы ложный 304.
+        return (*row, get_ingredients_version()), None
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
+                is_in_shopping_cart=Exists(
+                    ShoppingCart.objects.filter(
+                        user=user, recipe=OuterRef('pk')
+                    )
+                ),
+            )
+        return queryset.annotate(
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_in_shopping_cart=Value(False, output_field=BooleanField()),
+        )
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeCreateSerializer
         return RecipeListSerializer
     
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == 'list':
+            context['pantry'] = get_pantry(self.request)
+        return context
+    
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            recipe = serializer.save(author=self.request.user)
+            change_counter(
+                User.objects.filter(pk=self.request.user.pk), 'recipes_count'
+            )
+            fan_out_recipe(recipe)
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            update_recipe_in_shopping_lists(
+                instance.id, get_recipe_amounts(instance.id), {}
+            )
+            instance.delete()
+            change_counter(
+                User.objects.filter(pk=instance.author_id),
+                'recipes_count',
+                -1
+            )
+    
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(self.get_queryset(), request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score')
+        return Response(RecipeMinifiedSerializer(recipes, many=True).data)
+    
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def recommended(self, request):
+        user = request.user
+        recipes = list(
+            Recipe.objects.filter(
+                recommended_to__user=user
+            ).exclude(
+                favorites__user=user
+            ).order_by('-recommended_to__score')
+        )
+        if not recipes:
+            # Пока рекомендации не рассчитаны, показываются популярные.
+            recipes = Recipe.objects.exclude(author=user).exclude(
+                favorites__user=user
+            ).order_by(
+                '-favorites_count', '-id'
+            )[:settings.RECOMMENDATIONS_TOP_K]
+        return Response(RecipeMinifiedSerializer(recipes, many=True).data)
     
     @action(
         detail=True,
@@ -183,12 +538,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data)
     
-    def _handle_recipe_action(self, request, recipe, model_class, error_message, success_message):
+    def _handle_recipe_action(self, request, recipe, model_class,
+                              counter_field, error_message, success_message):
         """Общий метод для обработки добавления/удаления рецепта в избранное или корзину."""
+        recipe_queryset = Recipe.objects.filter(pk=recipe.pk)
         if request.method == 'POST':
-            item, created = model_class.objects.get_or_create(
-                user=request.user, recipe=recipe
-            )
+            with transaction.atomic():
+                item, created = model_class.objects.get_or_create(
+                    user=request.user, recipe=recipe
+                )
+                if created:
+                    change_counter(recipe_queryset, counter_field)
+                    if model_class is ShoppingCart:
+                        add_recipe_to_shopping_list(request.user.id, recipe.id)
             
             if not created:
                 return Response(
@@ -200,9 +562,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=HTTPStatus.CREATED)
         
         elif request.method == 'DELETE':
-            deleted, _ = model_class.objects.filter(
-                user=request.user, recipe=recipe
-            ).delete()
+            with transaction.atomic():
+                deleted, _ = model_class.objects.filter(
+                    user=request.user, recipe=recipe
+                ).delete()
+                if deleted:
+                    change_counter(recipe_queryset, counter_field, -1)
+                    if model_class is ShoppingCart:
+                        remove_recipe_from_shopping_list(
+                            request.user.id, recipe.id
+                        )
             
             if not deleted:
                 return Response(
@@ -223,6 +592,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request=request,
             recipe=recipe,
             model_class=Favorite,
+            counter_field='favorites_count',
             error_message='Рецепт уже добавлен в избранное.',
             success_message='Рецепт не найден в избранном.'
         )
@@ -238,6 +608,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             request=request,
             recipe=recipe,
             model_class=ShoppingCart,
+            counter_field='in_cart_count',
             error_message='Рецепт уже добавлен в список покупок.',
             success_message='Рецепт не найден в списке покупок.'
         )
@@ -246,13 +617,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
-        url_path='download_shopping_cart'
+        url_path='download_shopping_cart',
+        renderer_classes=[
+            TxtShoppingListRenderer,
+            CsvShoppingListRenderer,
+            PdfShoppingListRenderer,
+        ],
+        content_negotiation_class=FormatParamContentNegotiation,
     )
     def download_shopping_cart(self, request):
-        shopping_list = generate_shopping_list_txt(request.user)
-        response = HttpResponse(
-            shopping_list,
-            content_type='text/plain; charset=utf-8'
+        file_format = request.accepted_renderer.format
+        ingredients = get_shopping_list_ingredients(request.user).iterator()
+        response = StreamingHttpResponse(
+            SHOPPING_LIST_GENERATORS[file_format](ingredients),
+            content_type=request.accepted_renderer.media_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"'
         )
-        response['Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
         return response
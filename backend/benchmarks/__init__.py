@@ -0,0 +1,11 @@
+"""Нагрузочные микробенчмарки горячих путей API.
+
+Запуск из каталога backend:
+
+    USE_SQLITE=true python -m benchmarks --users 200 --recipes 2000 \
+        --output results.json
+
+Данные генерируются с фиксированным зерном во временной тестовой базе
+(SQLite или PostgreSQL, как настроено в settings), поэтому прогоны на
+одном коде сопоставимы между собой.
+"""
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Микробенчмарки API на сгенерированных данных',
+    )
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--ingredients', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument(
+        '--cases', help='Сценарии через запятую; по умолчанию все'
+    )
+    parser.add_argument('--output', help='Куда сохранить результаты в JSON')
+    parser.add_argument(
+        '--compare', help='JSON предыдущего прогона для сравнения'
+    )
+    return parser.parse_args()
+
+
+def summarize(durations, query_counts, duplicates, allocated):
+    cut_points = statistics.quantiles(durations, n=100, method='inclusive')
+    return {
+        'p50_ms': round(cut_points[49] * 1000, 3),
+        'p95_ms': round(cut_points[94] * 1000, 3),
+        'p99_ms': round(cut_points[98] * 1000, 3),
+        'mean_ms': round(statistics.fmean(durations) * 1000, 3),
+        'queries_mean': round(statistics.fmean(query_counts), 2),
+        'queries_max': max(query_counts),
+        'duplicate_queries_max': max(duplicates),
+        'alloc_peak_kib': round(allocated / 1024, 1),
+    }
+
+
+def run_case(case, context, iterations, warmup):
+    from django.db import connections
+    from rest_framework.test import APIClient
+
+    from api.metrics import RequestProfile
+
+    clients = {}
+
+    def get_client(user):
+        # force_authenticate(None) выходит из сессии и пишет её в базу,
+        # поэтому у каждого пользователя и у анонима свой клиент.
+        key = user.pk if user else None
+        if key not in clients:
+            clients[key] = APIClient()
+            if user is not None:
+                clients[key].force_authenticate(user)
+        return clients[key]
+
+    def send():
+        user, method, url, data = case(context)
+        client = get_client(user)
+        if data is None:
+            response = getattr(client, method)(url)
+        else:
+            response = getattr(client, method)(url, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise RuntimeError(
+                f'{case.__name__}: {method.upper()} {url} вернул '
+                f'{response.status_code}'
+            )
+
+    for _ in range(warmup):
+        send()
+
+    durations, query_counts, duplicates = [], [], []
+    connection = connections['default']
+    for _ in range(iterations):
+        profile = RequestProfile()
+        with connection.execute_wrapper(profile):
+            start = perf_counter()
+            send()
+            durations.append(perf_counter() - start)
+        query_counts.append(profile.query_count)
+        duplicates.append(
+            sum(count - 1 for _, count in profile.get_duplicates())
+        )
+
+    # Трассировка памяти замедляет выполнение, поэтому меряется отдельно.
+    tracemalloc.start()
+    send()
+    allocated = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(durations, query_counts, duplicates, allocated)
+
+
+def print_report(results, baseline=None):
+    header = f'{"сценарий":<24}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>7}'
+    if baseline:
+        header += f'{"Δp50":>9}{"Δp95":>9}'
+    print(header)
+    for name, result in results.items():
+        line = (
+            f'{name:<24}{result["p50_ms"]:>9.2f}{result["p95_ms"]:>9.2f}'
+            f'{result["p99_ms"]:>9.2f}{result["queries_mean"]:>7.1f}'
+        )
+        previous = (baseline or {}).get(name)
+        if previous:
+            for key in ('p50_ms', 'p95_ms'):
+                change = (result[key] / previous[key] - 1) * 100
+                line += f'{change:>+8.1f}%'
+        print(line)
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import (
+        override_settings,
+        setup_test_environment,
+        teardown_test_environment,
+    )
+
+    from .cases import CASES, Context
+    from .seed import seed
+
+    names = args.cases.split(',') if args.cases else list(CASES)
+    unknown = set(names) - set(CASES)
+    if unknown:
+        sys.exit(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, ALLOWED_HOSTS=['testserver']
+        ):
+            data = seed(
+                users=args.users,
+                recipes=args.recipes,
+                ingredients=args.ingredients,
+                seed=args.seed,
+            )
+            context = Context(random.Random(args.seed))
+            results = {
+                name: run_case(
+                    CASES[name], context, args.iterations, args.warmup
+                )
+                for name in names
+            }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': args.seed,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'debug': settings.DEBUG,
+            'data': data,
+        },
+        'results': results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
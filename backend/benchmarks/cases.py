@@ -0,0 +1,106 @@
+"""Сценарии бенчмарков: каждый возвращает готовый к отправке запрос."""
+import base64
+import io
+
+from django.db.models import Count
+from PIL import Image
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+PAGE_SIZE = 6
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (200, 120, 40)).save(buffer, 'JPEG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/jpeg;base64,{encoded}'
+
+
+class Context:
+    """Пользователи и объекты, на которых гоняются сценарии."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        # Самый активный подписчик и владелец самой длинной корзины
+        # дают худший случай для своих сценариев.
+        self.reader = User.objects.annotate(
+            total=Count('subscriptions')
+        ).order_by('-total', 'id').first()
+        self.shopper = User.objects.annotate(
+            total=Count('shopping_cart')
+        ).order_by('-total', 'id').first()
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.pages = max(1, -(-len(self.recipe_ids) // PAGE_SIZE))
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.image = make_image()
+
+
+def recipe_list_anonymous(context):
+    return None, 'get', f'/api/recipes/?limit={PAGE_SIZE}', None
+
+
+def recipe_list(context):
+    page = context.rng.randint(1, context.pages)
+    return (
+        context.reader, 'get',
+        f'/api/recipes/?page={page}&limit={PAGE_SIZE}', None
+    )
+
+
+def recipe_detail(context):
+    recipe_id = context.rng.choice(context.recipe_ids)
+    return context.reader, 'get', f'/api/recipes/{recipe_id}/', None
+
+
+def subscriptions(context):
+    return (
+        context.reader, 'get',
+        '/api/users/subscriptions/?limit=6&recipes_limit=3', None
+    )
+
+
+def ingredient_search(context):
+    prefix = context.rng.choice(context.ingredient_names)[:3]
+    return None, 'get', f'/api/ingredients/?name={prefix}', None
+
+
+def shopping_list_download(context):
+    return (
+        context.shopper, 'get',
+        '/api/recipes/download_shopping_cart/?format=txt', None
+    )
+
+
+def recipe_create(context):
+    ingredient_ids = context.rng.sample(context.ingredient_ids, 6)
+    return context.reader, 'post', '/api/recipes/', {
+        'ingredients': [
+            {'id': ingredient_id, 'amount': context.rng.randint(1, 100)}
+            for ingredient_id in ingredient_ids
+        ],
+        'image': context.image,
+        'name': 'Бенчмарк',
+        'text': 'Рецепт, созданный бенчмарком',
+        'cooking_time': 30,
+    }
+
+
+CASES = {
+    case.__name__: case
+    for case in (
+        recipe_list_anonymous,
+        recipe_list,
+        recipe_detail,
+        subscriptions,
+        ingredient_search,
+        shopping_list_download,
+        recipe_create,
+    )
+}
@@ -0,0 +1,148 @@
+import random
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+
+from recipes.fulltext import update_search_index
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Subscription, User
+
+SYLLABLES = (
+    'ка', 'ро', 'ми', 'ла', 'то', 'са', 'ве', 'ну', 'бо', 'ри', 'ше', 'да'
+)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+IMAGE_NAME = 'recipes/images/benchmark.png'
+BATCH_SIZE = 1000
+
+
+def make_word(rng, syllables):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables))
+
+
+def popularity_weights(count):
+    """Веса по закону Ципфа: немногие авторы собирают большинство связей."""
+    return [1 / rank for rank in range(1, count + 1)]
+
+
+def sample_unique(rng, population, weights, count):
+    chosen = set()
+    for _ in range(count * 3):
+        if len(chosen) >= count:
+            break
+        chosen.add(rng.choices(population, weights)[0])
+    return chosen
+
+
+def seed(users=200, recipes=2000, ingredients=500, seed=0):
+    """Заполняет базу детерминированными данными и возвращает их объём."""
+    rng = random.Random(seed)
+
+    names = set()
+    while len(names) < ingredients:
+        names.add(f'{make_word(rng, 2)} {make_word(rng, rng.randint(2, 3))}')
+    Ingredient.objects.bulk_create(
+        [
+            Ingredient(name=name, measurement_unit=rng.choice(UNITS))
+            for name in sorted(names)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+
+    password = make_password('benchmark')
+    User.objects.bulk_create(
+        [
+            User(
+                email=f'user{number}@example.com',
+                username=f'user{number}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(users)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    user_ids = list(User.objects.order_by('id').values_list('id', flat=True))
+    weights = popularity_weights(len(user_ids))
+
+    Recipe.objects.bulk_create(
+        [
+            Recipe(
+                author_id=rng.choices(user_ids, weights)[0],
+                name=f'{make_word(rng, 3)} {make_word(rng, 2)}'.capitalize(),
+                text=' '.join(
+                    make_word(rng, rng.randint(1, 4))
+                    for _ in range(rng.randint(10, 40))
+                ),
+                image=IMAGE_NAME,
+                cooking_time=rng.randint(5, 180),
+            )
+            for _ in range(recipes)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    recipe_ids = list(
+        Recipe.objects.order_by('id').values_list('id', flat=True)
+    )
+    RecipeIngredient.objects.bulk_create(
+        [
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=rng.randint(1, 100),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids, rng.randint(3, 10)
+            )
+        ],
+        batch_size=BATCH_SIZE
+    )
+
+    subscriptions, favorites, carts = [], [], []
+    recipe_weights = popularity_weights(len(recipe_ids))
+    for user_id in user_ids:
+        authors = sample_unique(rng, user_ids, weights, rng.randint(0, 20))
+        subscriptions.extend(
+            Subscription(user_id=user_id, author_id=author_id)
+            for author_id in authors - {user_id}
+        )
+        favorites.extend(
+            Favorite(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in sample_unique(
+                rng, recipe_ids, recipe_weights, rng.randint(0, 30)
+            )
+        )
+        carts.extend(
+            ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in sample_unique(
+                rng, recipe_ids, recipe_weights, rng.randint(0, 8)
+            )
+        )
+    for model, objects in (
+        (Subscription, subscriptions),
+        (Favorite, favorites),
+        (ShoppingCart, carts),
+    ):
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+    # Денормализованные данные строятся теми же командами, что и в проде.
+    call_command('recount', verbosity=0, stdout=StringIO())
+    call_command('rebuild_shopping_lists', verbosity=0, stdout=StringIO())
+    update_search_index()
+    return {
+        'users': len(user_ids),
+        'recipes': len(recipe_ids),
+        'ingredients': len(ingredient_ids),
+        'subscriptions': len(subscriptions),
+        'favorites': len(favorites),
+        'shopping_carts': len(carts),
+    }
@@ -3,12 +3,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from api.views import short_link_redirect
+from api.views import metrics, short_link_redirect
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('s/<str:short_code>/', short_link_redirect, name='short_link'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -1,14 +1,18 @@
 from django.contrib import admin
-from django.db.models import Count, Prefetch
+from django.db.models import Prefetch
 
 from api.constants import MIN_INGREDIENT_AMOUNT
 
 from .models import (
     Favorite,
+    FeedItem,
     Ingredient,
     Recipe,
     RecipeIngredient,
+    RecommendedRecipe,
     ShoppingCart,
+    ShoppingListItem,
+    SimilarRecipe,
 )
 
 
@@ -21,7 +25,8 @@ class RecipeIngredientInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'name', 'author', 'cooking_time', 'created', 'favorites_count'
+        'id', 'name', 'author', 'cooking_time', 'created',
+        'favorites_count', 'in_cart_count'
     )
     list_filter = (
         'created',
@@ -31,7 +36,7 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name',) 
     ordering = ('-created',)
     inlines = (RecipeIngredientInline,)
-    readonly_fields = ('favorites_count',)
+    readonly_fields = ('favorites_count', 'in_cart_count')
     
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
@@ -41,15 +46,7 @@ class RecipeAdmin(admin.ModelAdmin):
                 'recipe_ingredients',
                 queryset=RecipeIngredient.objects.select_related('ingredient')
             )
-        ).annotate(
-            favorites_count=Count('favorites')
         )
-    
-    def favorites_count(self, obj):
-        return obj.favorites_count
-    
-    favorites_count.short_description = 'В избранном'
-    favorites_count.admin_order_field = 'favorites_count'
 
 
 @admin.register(RecipeIngredient)
@@ -73,3 +70,31 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     search_fields = ('user__username', 'recipe__name')
     ordering = ('-created',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
+    readonly_fields = ('user', 'ingredient', 'total_amount')
+
+
+@admin.register(FeedItem)
+class FeedItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'recipe', 'created')
+    search_fields = ('user__username', 'recipe__name')
+    readonly_fields = ('user', 'recipe', 'created')
+
+
+@admin.register(SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'recipe', 'similar', 'score')
+    search_fields = ('recipe__name', 'similar__name')
+    readonly_fields = ('recipe', 'similar', 'score')
+
+
+@admin.register(RecommendedRecipe)
+class RecommendedRecipeAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'recipe', 'score')
+    search_fields = ('user__username', 'recipe__name')
+    readonly_fields = ('user', 'recipe', 'score')
@@ -0,0 +1,227 @@
+"""Ленты рецептов от авторов, на которых подписан пользователь.
+
+Рецепты авторов с числом подписчиков не больше
+FEED_FANOUT_MAX_SUBSCRIBERS раскладываются по лентам подписчиков при
+публикации (fan-out on write). Рецепты более популярных авторов при
+чтении берутся прямо из recipes_recipe (fan-out on read), и оба
+источника сливаются по (created, id).
+"""
+import heapq
+import random
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+
+from users.models import Subscription, User
+
+from .models import FeedItem, Recipe
+
+BACKFILL_BATCH_SIZE = 1000
+TRIM_SLACK = 0.1
+"""На какую долю FEED_TIMELINE_LENGTH лента в среднем перерастает предел."""
+
+
+def is_fanout_author(author):
+    return author.subscribers_count <= settings.FEED_FANOUT_MAX_SUBSCRIBERS
+
+
+def trim_timelines(user_ids):
+    """Обрезает ленты user_ids до FEED_TIMELINE_LENGTH записей."""
+    if not user_ids or not connection.features.supports_over_clause:
+        return
+    limit = settings.FEED_TIMELINE_LENGTH
+    overgrown = FeedItem.objects.filter(
+        user_id__in=user_ids
+    ).values('user_id').annotate(
+        total=Count('id')
+    ).filter(
+        total__gt=limit
+    ).values_list('user_id', flat=True)
+    overgrown = list(overgrown)
+    if not overgrown:
+        return
+    expired = FeedItem.objects.filter(user_id__in=overgrown).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('created').desc(), F('recipe_id').desc()],
+        )
+    ).filter(position__gt=limit).values_list('id', flat=True)
+    FeedItem.objects.filter(id__in=list(expired)).delete()
+
+
+def fan_out_recipe(recipe):
+    """Кладёт новый рецепт в ленты подписчиков автора.
+
+    Для популярных авторов ничего не делает: их рецепты попадают в
+    ленту при чтении. Подписчики выбираются с пределом, поэтому у
+    популярного автора читается не больше порога плюс одна строка.
+
+    Раскладка удлиняет каждую ленту на одну запись, поэтому лента
+    проверяется с вероятностью 1 / (FEED_TIMELINE_LENGTH * TRIM_SLACK):
+    между проверками она вырастает в среднем на TRIM_SLACK, а подсчёт
+    записей идёт по малой доле подписчиков, а не по всем.
+    """
+    threshold = settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    follower_ids = list(
+        Subscription.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True)[:threshold + 1]
+    )
+    if len(follower_ids) > threshold:
+        return
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user_id=user_id, recipe=recipe, created=recipe.created)
+            for user_id in follower_ids
+        ],
+        ignore_conflicts=True,
+    )
+    probability = 1 / max(1, settings.FEED_TIMELINE_LENGTH * TRIM_SLACK)
+    trim_timelines([
+        user_id for user_id in follower_ids
+        if random.random() < probability
+    ])
+
+
+def add_author_to_feed(user, author):
+    """Заполняет ленту нового подписчика последними рецептами автора."""
+    if not is_fanout_author(author):
+        return
+    recipes = Recipe.objects.filter(author=author).order_by(
+        '-created', '-id'
+    ).values_list('id', 'created')[:settings.FEED_TIMELINE_LENGTH]
+    FeedItem.objects.bulk_create(
+        [
+            FeedItem(user=user, recipe_id=recipe_id, created=created)
+            for recipe_id, created in recipes
+        ],
+        ignore_conflicts=True,
+    )
+    trim_timelines([user.id])
+
+
+def remove_author_from_feed(user, author):
+    FeedItem.objects.filter(user=user, recipe__author=author).delete()
+
+
+def fan_out_missing_recipes(author_ids):
+    """Раскладывает недавние рецепты авторов, которых нет ни в одной ленте.
+
+    Нужна, когда рецепты появились без раскладки: пока автор был выше
+    порога или при импорте. Авторы выше порога пропускаются, их рецепты
+    подтягиваются при чтении. Уже разложенные рецепты не трогаются,
+    поэтому повторный вызов стоит одного запроса на автора.
+    """
+    limit = settings.FEED_TIMELINE_LENGTH
+    fanout_ids = User.objects.filter(
+        pk__in=author_ids,
+        subscribers_count__lte=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+    ).values_list('pk', flat=True)
+    for author_id in fanout_ids:
+        recipes = list(
+            Recipe.objects.filter(author_id=author_id).exclude(
+                Exists(FeedItem.objects.filter(recipe=OuterRef('pk')))
+            ).order_by('-created', '-id').values_list('id', 'created')[:limit]
+        )
+        if not recipes:
+            continue
+        follower_ids = list(
+            Subscription.objects.filter(
+                author_id=author_id
+            ).values_list('user_id', flat=True)
+        )
+        step = max(1, BACKFILL_BATCH_SIZE // len(recipes))
+        for start in range(0, len(follower_ids), step):
+            FeedItem.objects.bulk_create(
+                [
+                    FeedItem(
+                        user_id=user_id, recipe_id=recipe_id, created=created
+                    )
+                    for user_id in follower_ids[start:start + step]
+                    for recipe_id, created in recipes
+                ],
+                ignore_conflicts=True,
+            )
+        trim_timelines(follower_ids)
+
+
+def backfill_returned_authors(author_ids):
+    """Раскладывает рецепты авторов, вернувшихся на порог fan-out.
+
+    Пока подписчиков у автора больше FEED_FANOUT_MAX_SUBSCRIBERS, его
+    рецепты не раскладываются, а подтягиваются при чтении. Когда
+    отписка возвращает автора на порог, чтение перестаёт их подтягивать,
+    поэтому они раскладываются по лентам оставшихся подписчиков.
+    """
+    fan_out_missing_recipes(
+        User.objects.filter(
+            pk__in=author_ids,
+            subscribers_count=settings.FEED_FANOUT_MAX_SUBSCRIBERS,
+        ).values_list('pk', flat=True)
+    )
+
+
+def get_seek_filter(position, id_field):
+    """Условие «строго раньше position» для ключа (created, id)."""
+    if position is None:
+        return Q()
+    created, recipe_id = position
+    return Q(created__lt=created) | Q(
+        created=created, **{f'{id_field}__lt': recipe_id}
+    )
+
+
+def get_feed_keys(user, position, limit):
+    """До limit ключей (created, id) ленты, строго раньше position."""
+    pulled_author_ids = list(
+        Subscription.objects.filter(
+            user=user,
+            author__subscribers_count__gt=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+        ).values_list('author_id', flat=True)
+    )
+    sources = [
+        FeedItem.objects.filter(
+            get_seek_filter(position, 'recipe_id'), user=user
+        ).order_by('-created', '-recipe_id').values_list(
+            'created', 'recipe_id'
+        )[:limit]
+    ]
+    if pulled_author_ids:
+        sources.append(
+            Recipe.objects.filter(
+                get_seek_filter(position, 'id'),
+                author_id__in=pulled_author_ids
+            ).order_by('-created', '-id').values_list(
+                'created', 'id'
+            )[:limit]
+        )
+
+    keys = []
+    seen = set()
+    # Рецепт автора, ставшего популярным, может оказаться в обоих
+    # источниках: старые записи ленты остаются, пока их не вытеснят.
+    for key in heapq.merge(*sources, reverse=True):
+        if key[1] in seen:
+            continue
+        seen.add(key[1])
+        keys.append(key)
+        if len(keys) == limit:
+            break
+    return keys
+
+
+def rebuild_feeds():
+    """Пересобирает все ленты по текущим подпискам.
+
+    Нужна после смены FEED_FANOUT_MAX_SUBSCRIBERS: авторы, оказавшиеся
+    под новым порогом, сами собой не раскладываются.
+    """
+    FeedItem.objects.all().delete()
+    subscriptions = Subscription.objects.filter(
+        author__subscribers_count__lte=settings.FEED_FANOUT_MAX_SUBSCRIBERS
+    ).select_related('user', 'author')
+    for subscription in subscriptions.iterator():
+        add_author_to_feed(subscription.user, subscription.author)
@@ -0,0 +1,98 @@
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F, FloatField
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+WORD_RE = re.compile(r'\w+')
+
+POSTGRES_UPDATE_SQL = f'''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', recipe.name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', recipe.text), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE((
+            SELECT string_agg(ingredient.name, ' ')
+            FROM recipes_recipeingredient AS recipe_ingredient
+            JOIN recipes_ingredient AS ingredient
+                ON ingredient.id = recipe_ingredient.ingredient_id
+            WHERE recipe_ingredient.recipe_id = recipe.id
+        ), '')), 'C')
+'''
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients)
+    SELECT recipe.id, recipe.name, recipe.text, COALESCE((
+        SELECT group_concat(ingredient.name, ' ')
+        FROM recipes_recipeingredient AS recipe_ingredient
+        JOIN recipes_ingredient AS ingredient
+            ON ingredient.id = recipe_ingredient.ingredient_id
+        WHERE recipe_ingredient.recipe_id = recipe.id
+    ), '')
+    FROM recipes_recipe AS recipe
+'''
+SQLITE_MATCH_SQL = f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+SQLITE_RANK_SQL = (
+    f'SELECT -bm25({FTS_TABLE}, 10.0, 2.0, 1.0) FROM {FTS_TABLE} '
+    f'WHERE {FTS_TABLE} MATCH %s AND rowid = recipes_recipe.id'
+)
+
+
+def update_search_index(recipe_ids=None):
+    """Пересчитывает поисковый индекс для рецептов recipe_ids или всех.
+
+    Индекс покрывает название, описание и названия ингредиентов:
+    tsvector-колонку на PostgreSQL и теневую FTS5-таблицу на SQLite.
+    """
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            if recipe_ids is None:
+                cursor.execute(POSTGRES_UPDATE_SQL)
+            else:
+                cursor.execute(
+                    f'{POSTGRES_UPDATE_SQL} WHERE recipe.id = ANY(%s)',
+                    [recipe_ids]
+                )
+        elif connection.vendor == 'sqlite':
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(SQLITE_INSERT_SQL)
+            else:
+                placeholders = ', '.join(['%s'] * len(recipe_ids))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} '
+                    f'WHERE rowid IN ({placeholders})',
+                    recipe_ids
+                )
+                cursor.execute(
+                    f'{SQLITE_INSERT_SQL} '
+                    f'WHERE recipe.id IN ({placeholders})',
+                    recipe_ids
+                )
+
+
+def search_recipes(queryset, query):
+    """Рецепты, подходящие под запрос, от наиболее релевантных."""
+    words = WORD_RE.findall(query.lower())
+    if not words:
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            ' & '.join(f'{word}:*' for word in words),
+            config=SEARCH_CONFIG,
+            search_type='raw',
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-created')
+    match = ' '.join(f'"{word}"*' for word in words)
+    return queryset.filter(
+        id__in=RawSQL(SQLITE_MATCH_SQL, (match,))
+    ).annotate(
+        search_rank=RawSQL(SQLITE_RANK_SQL, (match,), FloatField())
+    ).order_by('-search_rank', '-created')
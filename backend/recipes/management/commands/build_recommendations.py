@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from recipes.recommendations import BACKEND, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты и рекомендации по избранному'
+
+    def handle(self, *args, **options):
+        similar, recommended = build_recommendations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендации пересчитаны ({BACKEND}): похожих рецептов '
+            f'{similar}, рекомендаций {recommended}'
+        ))
@@ -0,0 +1,88 @@
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.images import get_variant_name
+from api.storage import content_storage
+from recipes.models import Recipe
+from users.models import User
+
+IMAGE_FIELDS = ((Recipe, 'image'), (User, 'avatar'))
+
+
+def get_reference_counts():
+    """Число ссылок на каждый файл из Recipe.image и User.avatar."""
+    counts = Counter()
+    for model, field in IMAGE_FIELDS:
+        counts.update(
+            model.objects.exclude(
+                **{field: ''}
+            ).values_list(field, flat=True).iterator()
+        )
+    return counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT картинки и их варианты, на которые '
+        'не ссылается ни один рецепт или пользователь'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=3600,
+            help=(
+                'Не трогать файлы моложе стольких секунд: они могут '
+                'принадлежать ещё не зафиксированной транзакции'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        counts = get_reference_counts()
+        keep = set(counts)
+        for name in counts:
+            keep.update(
+                get_variant_name(name, variant)
+                for variant in settings.IMAGE_VARIANTS
+            )
+        shared = sum(1 for count in counts.values() if count > 1)
+        self.stdout.write(
+            f'Файлов в использовании: {len(counts)}, '
+            f'из них общих: {shared}'
+        )
+
+        deadline = time.time() - options['min_age']
+        deleted = freed = 0
+        for model, field in IMAGE_FIELDS:
+            directory = model._meta.get_field(field).upload_to
+            root = content_storage.path(directory)
+            for path, _, filenames in os.walk(root):
+                for filename in filenames:
+                    full_path = os.path.join(path, filename)
+                    name = os.path.relpath(
+                        full_path, content_storage.location
+                    ).replace(os.sep, '/')
+                    stat = os.stat(full_path)
+                    if name in keep or stat.st_mtime > deadline:
+                        continue
+                    deleted += 1
+                    freed += stat.st_size
+                    if options['dry_run']:
+                        self.stdout.write(name)
+                    else:
+                        content_storage.delete(name)
+
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} файлов: {deleted}, {freed} байт'
+        ))
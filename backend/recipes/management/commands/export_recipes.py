@@ -0,0 +1,59 @@
+import json
+import sys
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.transfer import get_progress, recipe_to_record
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты в файл JSON Lines для import_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            nargs='?',
+            default='-',
+            help='Путь к файлу; по умолчанию stdout',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов читать из базы за раз',
+        )
+        parser.add_argument(
+            '--embed-images',
+            action='store_true',
+            help='Встраивать картинки как data URL вместо имён файлов',
+        )
+
+    def handle(self, *args, **options):
+        if options['file'] == '-':
+            # Прогресс уходит в stderr, чтобы не смешиваться с выгрузкой.
+            self.dump(sys.stdout, self.stderr, options)
+        else:
+            with open(options['file'], 'w', encoding='utf-8') as file:
+                self.dump(file, self.stdout, options)
+
+    def dump(self, file, log, options):
+        batch_size = options['batch_size']
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'recipe_ingredients__ingredient'
+        ).order_by('id')
+        started = perf_counter()
+        exported = 0
+        for recipe in recipes.iterator(chunk_size=batch_size):
+            file.write(json.dumps(
+                recipe_to_record(recipe, options['embed_images']),
+                ensure_ascii=False,
+            ))
+            file.write('\n')
+            exported += 1
+            if exported % batch_size == 0:
+                log.write(get_progress(exported, started))
+        log.write(self.style.SUCCESS(
+            f'Выгружено {get_progress(exported, started)}'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.images import generate_variants
+from api.signals import mark_variants_ready
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт недостающие варианты картинок рецептов и аватаров '
+        'и отмечает их готовность'
+    )
+
+    def handle(self, *args, **options):
+        sources = (
+            (Recipe, 'image', lambda pk: ('recipes', f'recipe:{pk}')),
+            (User, 'avatar', lambda pk: ('users', f'author:{pk}')),
+        )
+        created = failed = 0
+        for model, field, get_tags in sources:
+            rows = model.objects.exclude(**{field: ''}).values_list(
+                'pk', field
+            )
+            for pk, name in rows.iterator():
+                try:
+                    created += generate_variants(name)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                mark_variants_ready(model, pk, field, name, *get_tags(pk))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано вариантов: {created}, ошибок: {failed}'
+        ))
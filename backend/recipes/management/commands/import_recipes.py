@@ -0,0 +1,77 @@
+import json
+import sys
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import RecipeImporter, get_progress, parse_record
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из файла JSON Lines, выгруженного '
+        'export_recipes, и раскладывает их по лентам подписчиков. '
+        'Варианты картинок не создаёт: после загрузки запустите '
+        'generate_image_variants'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Путь к файлу или - для stdin')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько рецептов создавать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        if options['file'] == '-':
+            self.load(sys.stdin, options['batch_size'])
+        else:
+            with open(options['file'], encoding='utf-8') as file:
+                self.load(file, options['batch_size'])
+
+    def load(self, file, batch_size):
+        importer = RecipeImporter()
+        started = perf_counter()
+        imported = skipped = 0
+        batch = []
+        line_numbers = []
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                batch.append(parse_record(json.loads(line)))
+            except ValueError as error:
+                skipped += 1
+                self.stderr.write(f'Строка {line_number}: {error}')
+                continue
+            line_numbers.append(line_number)
+            if len(batch) >= batch_size:
+                created, rejected = self.import_batch(
+                    importer, batch, line_numbers
+                )
+                imported += created
+                skipped += rejected
+                batch = []
+                line_numbers = []
+                self.stdout.write(get_progress(imported, started))
+        if batch:
+            created, rejected = self.import_batch(
+                importer, batch, line_numbers
+            )
+            imported += created
+            skipped += rejected
+        importer.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено {get_progress(imported, started)}; пропущено '
+            f'строк: {skipped}, новых авторов: {importer.created_authors}, '
+            f'новых ингредиентов: {importer.created_ingredients}'
+        ))
+
+    def import_batch(self, importer, batch, line_numbers):
+        imported, errors = importer.import_batch(batch)
+        for index, error in errors:
+            self.stderr.write(f'Строка {line_numbers[index]}: {error}')
+        return imported, len(errors)
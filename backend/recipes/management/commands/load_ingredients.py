@@ -1,22 +1,102 @@
 import csv
+import json
+from itertools import islice
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from api.cache import invalidate_tags
+from api.constants import (
+    MAX_LENGTH_INGREDIENT_NAME,
+    MAX_LENGTH_MEASUREMENT_UNIT,
+)
 from recipes.models import Ingredient
 
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        yield row if len(row) == 2 else None
+
+
+def read_json(file):
+    """Объекты из JSON-массива или из JSON Lines, по одному.
+
+    Файл читается порциями, поэтому в памяти не бывает больше одной
+    порции и одного объекта.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer = file.read(READ_CHUNK_SIZE)
+            position = 0
+            eof = not buffer
+            continue
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(READ_CHUNK_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+            continue
+        position = end
+        if isinstance(item, dict):
+            yield [item.get('name'), item.get('measurement_unit')]
+        else:
+            yield None
+
+
+def clean_row(row):
+    """Пара (название, единица) или None для некорректной строки."""
+    if row is None or not all(isinstance(value, str) for value in row):
+        return None
+    name, measurement_unit = (value.strip() for value in row)
+    if not name or not measurement_unit or (
+        len(name) > MAX_LENGTH_INGREDIENT_NAME
+        or len(measurement_unit) > MAX_LENGTH_MEASUREMENT_UNIT
+    ):
+        return None
+    return name, measurement_unit
+
 
 class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV (название,единица) или JSON; '
+        'уже существующие пропускаются'
+    )
+
     def add_arguments(self, parser):
         parser.add_argument(
             'file',
             type=str,
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк обрабатывать за раз',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать изменения, ничего не записывая',
+        )
 
     def handle(self, *args, **options):
         file_path = Path(options['file'])
-        
+
         if not file_path.is_absolute():
             data_dir = settings.BASE_DIR.parent / 'data'
             file_path = data_dir / file_path
@@ -27,36 +107,72 @@ class Command(BaseCommand):
             )
             return
 
+        reader = read_json if file_path.suffix == '.json' else read_csv
         try:
-            with open(file_path, encoding='utf-8') as file:
-                reader = csv.reader(file)
-                ingredients = []
-                for row in reader:
-                    if len(row) != 2:
-                        continue
-                    name, measurement_unit = row
-                    ingredients.append(
-                        Ingredient(
-                            name=name.strip(),
-                            measurement_unit=measurement_unit.strip()
-                        )
-                    )
-                
-                if ingredients:
-                    Ingredient.objects.bulk_create(
-                        ingredients,
-                        ignore_conflicts=True
-                    )
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'Успешно загружено {len(ingredients)} ингредиентов'
-                        )
-                    )
-                else:
-                    self.stdout.write(
-                        self.style.WARNING('Файл не содержит данных')
-                    )
-        except Exception as e:
+            with open(file_path, encoding='utf-8', newline='') as file:
+                inserted, existing, invalid = self.load(
+                    reader(file), options['batch_size'], options['dry_run']
+                )
+        except (OSError, ValueError, csv.Error) as e:
             self.stdout.write(
                 self.style.ERROR(f'Ошибка при загрузке файла: {e}')
-            ) 
\ No newline at end of file
+            )
+            return
+
+        if inserted and not options['dry_run']:
+            invalidate_tags('ingredients')
+        if not inserted and not existing:
+            self.stdout.write(
+                self.style.WARNING('Файл не содержит данных')
+            )
+            return
+        prefix = 'Проверка без записи: ' if options['dry_run'] else ''
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{prefix}добавлено {inserted}, уже было {existing}, '
+                f'некорректных строк {invalid}'
+            )
+        )
+
+    def load(self, rows, batch_size, dry_run):
+        """Вставляет новые ингредиенты пачками по batch_size строк.
+
+        Существующие пары ищутся одним запросом на пачку, так что
+        память ограничена пачкой. При dry_run запоминаются только
+        пары, которые были бы вставлены, чтобы не засчитать их повторно.
+        """
+        inserted = existing = invalid = 0
+        planned = set()
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return inserted, existing, invalid
+            keys = []
+            for row in batch:
+                key = clean_row(row)
+                if key is None:
+                    invalid += 1
+                else:
+                    keys.append(key)
+            unique_keys = set(keys)
+            stored = set(
+                Ingredient.objects.filter(
+                    name__in={name for name, _ in unique_keys}
+                ).values_list('name', 'measurement_unit')
+            ) & unique_keys
+            new_keys = unique_keys - stored - planned
+            existing += len(keys) - len(new_keys)
+            inserted += len(new_keys)
+            if dry_run:
+                planned |= new_keys
+                continue
+            # ignore_conflicts на случай параллельной загрузки: пара могла
+            # появиться между выборкой и вставкой.
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new_keys
+                ],
+                ignore_conflicts=True,
+            )
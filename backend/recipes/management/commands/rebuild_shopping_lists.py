@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+from recipes.shopping_list import get_live_totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет материализованные списки покупок с корзинами '
+        'и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сообщить о расхождениях, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            live = get_live_totals()
+            stored = {
+                (item.user_id, item.ingredient_id): item
+                for item in ShoppingListItem.objects.select_for_update()
+            }
+            missing = [key for key in live if key not in stored]
+            extra = [item for key, item in stored.items() if key not in live]
+            changed = []
+            for key, item in stored.items():
+                if key in live and item.total_amount != live[key]:
+                    item.total_amount = live[key]
+                    changed.append(item)
+
+            self.stdout.write(
+                f'Отсутствует: {len(missing)}, лишних: {len(extra)}, '
+                f'с неверной суммой: {len(changed)}'
+            )
+            if options['check']:
+                return
+
+            ShoppingListItem.objects.filter(
+                id__in=[item.id for item in extra]
+            ).delete()
+            ShoppingListItem.objects.bulk_update(
+                changed, ['total_amount'], batch_size=1000
+            )
+            ShoppingListItem.objects.bulk_create(
+                [
+                    ShoppingListItem(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=live[(user_id, ingredient_id)],
+                    )
+                    for user_id, ingredient_id in missing
+                ],
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок исправлены'))
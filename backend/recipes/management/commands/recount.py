@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики рецептов и пользователей'
+
+    def handle(self, *args, **options):
+        counters = (
+            (Recipe, 'favorites_count', count_subquery(Favorite, 'recipe')),
+            (Recipe, 'in_cart_count', count_subquery(ShoppingCart, 'recipe')),
+            (User, 'recipes_count', count_subquery(Recipe, 'author')),
+            (
+                User,
+                'subscribers_count',
+                count_subquery(Subscription, 'author')
+            ),
+        )
+        with transaction.atomic():
+            for model, field, actual in counters:
+                fixed = model.objects.exclude(
+                    **{field: actual}
+                ).update(**{field: actual})
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}.{field}: '
+                    f'исправлено {fixed}'
+                )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:15
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute("""
+            UPDATE recipes_recipe AS recipe SET search_vector =
+                setweight(to_tsvector('russian', recipe.name), 'A')
+                || setweight(to_tsvector('russian', recipe.text), 'B')
+                || setweight(to_tsvector('russian', COALESCE((
+                    SELECT string_agg(ingredient.name, ' ')
+                    FROM recipes_recipeingredient AS recipe_ingredient
+                    JOIN recipes_ingredient AS ingredient
+                        ON ingredient.id = recipe_ingredient.ingredient_id
+                    WHERE recipe_ingredient.recipe_id = recipe.id
+                ), '')), 'C')
+        """)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+            'USING fts5(name, text, ingredients)'
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete '
+            'AFTER DELETE ON recipes_recipe BEGIN '
+            'DELETE FROM recipes_recipe_fts WHERE rowid = old.id; END'
+        )
+        schema_editor.execute("""
+            INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+            SELECT recipe.id, recipe.name, recipe.text, COALESCE((
+                SELECT group_concat(ingredient.name, ' ')
+                FROM recipes_recipeingredient AS recipe_ingredient
+                JOIN recipes_ingredient AS ingredient
+                    ON ingredient.id = recipe_ingredient.ingredient_id
+                WHERE recipe_ingredient.recipe_id = recipe.id
+            ), '')
+            FROM recipes_recipe AS recipe
+        """)
+
+
+def drop_search_structures(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete'
+        )
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_ingredient_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            create_search_structures, drop_search_structures
+        ),
+    ]
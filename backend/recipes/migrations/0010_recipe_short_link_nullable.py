@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:20
+
+from django.db import migrations, models
+
+
+def clear_empty_short_links(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(short_link='').update(short_link=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_shopping_list_item'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='short_link',
+            field=models.CharField(blank=True, default=None, editable=False, help_text='Случайный код, выданный до перехода на коды из id', max_length=10, null=True, unique=True, verbose_name='Короткая ссылка'),
+        ),
+        migrations.RunPython(
+            clear_empty_short_links, migrations.RunPython.noop
+        ),
+    ]
@@ -1,12 +1,9 @@
-import random
-import string
-
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from api.constants import (
-    DEFAULT_SHORT_CODE_LENGTH,
     MAX_INGREDIENT_AMOUNT,
     MAX_LENGTH_INGREDIENT_NAME,
     MAX_LENGTH_MEASUREMENT_UNIT,
@@ -16,8 +13,11 @@ from api.constants import (
     MIN_COOKING_TIME,
     MIN_INGREDIENT_AMOUNT,
 )
+from api.storage import content_storage
 from users.models import User
 
+from . import short_codes
+
 User = get_user_model()
 
 
@@ -60,6 +60,14 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='recipes/images/',
+        storage=content_storage,
+    )
+    image_variants_source = models.CharField(
+        'Картинка с готовыми вариантами',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
     )
     text = models.TextField(
         'Описание',
@@ -79,36 +87,59 @@ class Recipe(models.Model):
     )
     short_link = models.CharField(
         verbose_name='Короткая ссылка',
+        help_text='Случайный код, выданный до перехода на коды из id',
         max_length=MAX_LENGTH_SHORT_CODE,
         unique=True,
         editable=False,
         blank=True,
-        default='',
+        null=True,
+        default=None,
     )
     created = models.DateTimeField(
         'Дата создания',
         auto_now_add=True,
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_cart_count = models.PositiveIntegerField(
+        'В списках покупок',
+        default=0,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        'Поисковый вектор',
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ['-created']
+        ordering = ['-created', '-id']
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'],
+                name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='recipe_author_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        if not self.short_link:
-            self.short_link = self.generate_short_link()
-        super().save(*args, **kwargs)
-
-    def generate_short_link(self):
-        characters = f"{string.ascii_letters}{string.digits}"
-        while True:
-            short_link = ''.join(random.choice(characters) for _ in range(DEFAULT_SHORT_CODE_LENGTH))
-            if not Recipe.objects.filter(short_link=short_link).exists():
-                return short_link
+    @property
+    def short_code(self):
+        return self.short_link or short_codes.encode(self.pk)
 
 
 class RecipeIngredient(models.Model):
@@ -210,3 +241,163 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user.username} добавил {self.recipe.name} в список покупок'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+
+    Материализованная сумма RecipeIngredient.amount по рецептам из
+    ShoppingCart; поддерживается в recipes.shopping_list.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount} у {self.user}'
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика, доставленный при публикации.
+
+    Лента ограничена FEED_TIMELINE_LENGTH записями на пользователя и
+    поддерживается в recipes.feed.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items',
+        verbose_name='Рецепт',
+    )
+    created = models.DateTimeField(
+        'Дата публикации рецепта',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-recipe'],
+                name='feed_item_user_created_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class SimilarRecipe(models.Model):
+    """Ближайший сосед рецепта по ингредиентам и избранному.
+
+    Списки рассчитываются пакетно в recipes.recommendations.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+
+class RecommendedRecipe(models.Model):
+    """Рецепт, рекомендованный пользователю по его избранному.
+
+    Списки рассчитываются пакетно в recipes.recommendations.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommended_recipes',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='recommended_to',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField('Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_recommended_recipe'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='recommended_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} для {self.user}'
@@ -0,0 +1,215 @@
+"""Похожие рецепты и рекомендации по избранному.
+
+Рецепт описывается двумя разреженными векторами: ингредиентами и
+пользователями, добавившими его в избранное. Сходство рецептов —
+взвешенная сумма косинусов этих векторов; для каждого рецепта хранится
+RECOMMENDATIONS_TOP_K ближайших соседей. Рекомендации пользователю
+складываются из соседей рецептов в его избранном, так что при запросе
+остаётся только прочитать готовый список по индексу.
+
+С NumPy и SciPy косинусы считаются умножением разреженных матриц
+блоками строк, без них — обходом инвертированного индекса на Python.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    RecommendedRecipe,
+    SimilarRecipe,
+)
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:
+    numpy = sparse = None
+
+BACKEND = 'numpy' if sparse is not None else 'python'
+BATCH_SIZE = 1000
+BLOCK_CELLS = 4_000_000
+"""Сколько ячеек плотного блока сходств держать в памяти за раз."""
+
+
+def get_vectors(pairs, positions):
+    """Нормированные строки {признак: вес} по парам (recipe_id, признак).
+
+    Вес признака — log(1 + N / df): общие для многих рецептов
+    ингредиенты и пользователи с огромным избранным говорят о сходстве
+    меньше редких. Пары рецептов, которых нет в positions (созданных
+    уже после того, как positions был прочитан), пропускаются.
+    """
+    rows = [{} for _ in positions]
+    frequency = Counter()
+    for recipe_id, feature in pairs:
+        position = positions.get(recipe_id)
+        if position is None:
+            continue
+        rows[position][feature] = 1.0
+        frequency[feature] += 1
+    for row in rows:
+        for feature in row:
+            row[feature] = math.log(1 + len(rows) / frequency[feature])
+        norm = math.sqrt(sum(value * value for value in row.values()))
+        for feature in row:
+            row[feature] /= norm
+    return rows
+
+
+def _python_neighbors(weighted_rows, k):
+    indexes = []
+    for weight, rows in weighted_rows:
+        postings = defaultdict(list)
+        for position, row in enumerate(rows):
+            for feature, value in row.items():
+                postings[feature].append((position, value))
+        indexes.append((weight, rows, postings))
+
+    for position in range(len(weighted_rows[0][1])):
+        scores = defaultdict(float)
+        for weight, rows, postings in indexes:
+            for feature, value in rows[position].items():
+                for other, other_value in postings[feature]:
+                    scores[other] += weight * value * other_value
+        scores.pop(position, None)
+        yield heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+
+def _to_matrix(rows):
+    columns = {}
+    indptr, indices, data = [0], [], []
+    for row in rows:
+        for feature, value in row.items():
+            indices.append(columns.setdefault(feature, len(columns)))
+            data.append(value)
+        indptr.append(len(indices))
+    return sparse.csr_matrix(
+        (data, indices, indptr), shape=(len(rows), max(len(columns), 1))
+    )
+
+
+def _numpy_neighbors(weighted_rows, k):
+    matrices = [
+        (weight, _to_matrix(rows)) for weight, rows in weighted_rows
+    ]
+    size = matrices[0][1].shape[0]
+    count = min(k, size - 1)
+    block = max(1, BLOCK_CELLS // max(size, 1))
+    for start in range(0, size, block):
+        stop = min(start + block, size)
+        if count <= 0:
+            yield from ([] for _ in range(start, stop))
+            continue
+        scores = numpy.zeros((stop - start, size))
+        for weight, matrix in matrices:
+            scores += weight * (matrix[start:stop] @ matrix.T).toarray()
+        scores[numpy.arange(stop - start), numpy.arange(start, stop)] = 0
+        top = numpy.argpartition(-scores, count - 1, axis=1)[:, :count]
+        for row, columns in zip(scores, top):
+            yield sorted(
+                (
+                    (int(column), float(row[column]))
+                    for column in columns if row[column] > 0
+                ),
+                key=itemgetter(1),
+                reverse=True,
+            )
+
+
+def get_neighbors(weighted_rows, k):
+    """По k ближайших (позиция, сходство) для каждой строки."""
+    if not weighted_rows[0][1]:
+        return iter(())
+    if sparse is not None:
+        return _numpy_neighbors(weighted_rows, k)
+    return _python_neighbors(weighted_rows, k)
+
+
+def get_recommendations(neighbors, favorites, authors, k):
+    """По k лучших (recipe_id, оценка) для каждого пользователя.
+
+    Оценка рецепта — сумма его сходства с рецептами из избранного.
+    Рецепты из избранного, собственные рецепты пользователя и рецепты
+    с неизвестным автором не рекомендуются.
+    """
+    for user_id, recipe_ids in favorites.items():
+        scores = defaultdict(float)
+        for recipe_id in recipe_ids:
+            for similar_id, score in neighbors.get(recipe_id, ()):
+                if authors.get(similar_id, user_id) != user_id:
+                    scores[similar_id] += score
+        for recipe_id in recipe_ids:
+            scores.pop(recipe_id, None)
+        yield user_id, heapq.nlargest(
+            k, scores.items(), key=itemgetter(1)
+        )
+
+
+def build_recommendations():
+    """Пересчитывает похожие рецепты и рекомендации пользователям.
+
+    Возвращает количество сохранённых соседей и рекомендаций.
+    """
+    top_k = settings.RECOMMENDATIONS_TOP_K
+    favorites_weight = settings.RECOMMENDATIONS_FAVORITES_WEIGHT
+    authors = dict(
+        Recipe.objects.order_by('id').values_list('id', 'author_id')
+    )
+    recipe_ids = list(authors)
+    positions = {
+        recipe_id: position for position, recipe_id in enumerate(recipe_ids)
+    }
+    favorite_pairs = list(
+        Favorite.objects.values_list('recipe_id', 'user_id')
+    )
+    weighted_rows = [
+        (
+            1 - favorites_weight,
+            get_vectors(
+                RecipeIngredient.objects.values_list(
+                    'recipe_id', 'ingredient_id'
+                ).iterator(),
+                positions,
+            ),
+        ),
+        (favorites_weight, get_vectors(favorite_pairs, positions)),
+    ]
+    neighbors = {
+        recipe_id: [
+            (recipe_ids[position], score) for position, score in row
+        ]
+        for recipe_id, row in zip(
+            recipe_ids, get_neighbors(weighted_rows, top_k)
+        )
+    }
+    favorites = defaultdict(set)
+    for recipe_id, user_id in favorite_pairs:
+        favorites[user_id].add(recipe_id)
+
+    similar = [
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for recipe_id, row in neighbors.items()
+        for similar_id, score in row
+    ]
+    recommended = [
+        RecommendedRecipe(user_id=user_id, recipe_id=recipe_id, score=score)
+        for user_id, row in get_recommendations(
+            neighbors, favorites, authors, top_k
+        )
+        for recipe_id, score in row
+    ]
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        RecommendedRecipe.objects.all().delete()
+        SimilarRecipe.objects.bulk_create(similar, batch_size=BATCH_SIZE)
+        RecommendedRecipe.objects.bulk_create(
+            recommended, batch_size=BATCH_SIZE
+        )
+    return len(similar), len(recommended)
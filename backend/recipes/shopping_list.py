@@ -0,0 +1,138 @@
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingListItem
+
+
+def get_recipe_amounts(recipe_id):
+    """Количества ингредиентов рецепта: {ingredient_id: amount}."""
+    return dict(
+        RecipeIngredient.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', 'amount')
+    )
+
+
+def get_cart_user_ids(recipe_id):
+    return list(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+    )
+
+
+def apply_shopping_list_changes(user_ids, changes):
+    """Прибавляет changes {ingredient_id: delta} к спискам user_ids.
+
+    Недостающие строки создаются, обнулившиеся удаляются; всё изменение
+    укладывается в три запроса независимо от числа ингредиентов.
+    """
+    changes = {
+        ingredient_id: delta
+        for ingredient_id, delta in changes.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not changes or not user_ids:
+        return
+    ShoppingListItem.objects.bulk_create(
+        [
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, total_amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, delta in changes.items() if delta > 0
+        ],
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=changes
+    )
+    items.update(
+        total_amount=Greatest(
+            F('total_amount') + Case(
+                *[
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in changes.items()
+                ],
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            Value(0)
+        )
+    )
+    items.filter(total_amount=0).delete()
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id, sign=1):
+    apply_shopping_list_changes(
+        [user_id],
+        {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+        }
+    )
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    add_recipe_to_shopping_list(user_id, recipe_id, sign=-1)
+
+
+def update_recipe_in_shopping_lists(recipe_id, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок с ним."""
+    changes = {
+        ingredient_id: (
+            new_amounts.get(ingredient_id, 0)
+            - old_amounts.get(ingredient_id, 0)
+        )
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    apply_shopping_list_changes(get_cart_user_ids(recipe_id), changes)
+
+
+def remove_recipes_from_shopping_lists(recipes):
+    """Вычитает рецепты recipes из всех списков покупок, где они есть.
+
+    Для удаления сразу многих рецептов, например вместе с автором:
+    списки исправляются двумя запросами независимо от числа рецептов
+    и корзин.
+    """
+    in_carts = RecipeIngredient.objects.filter(
+        recipe__in=recipes,
+        recipe__shopping_cart__user=OuterRef('user'),
+        ingredient=OuterRef('ingredient'),
+    )
+    removed = in_carts.order_by().values('ingredient').annotate(
+        total=Sum('amount')
+    ).values('total')
+    items = ShoppingListItem.objects.filter(Exists(in_carts))
+    items.update(
+        total_amount=Greatest(
+            F('total_amount') - Coalesce(Subquery(removed), Value(0)),
+            Value(0)
+        )
+    )
+    items.filter(total_amount=0).delete()
+
+
+def get_live_totals():
+    """Суммы по корзинам без таблицы: {(user_id, ingredient_id): n}."""
+    return {
+        (row['recipe__shopping_cart__user'], row['ingredient']): row['total']
+        for row in RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by().iterator()
+    }
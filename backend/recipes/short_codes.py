@@ -0,0 +1,65 @@
+"""Короткие коды рецептов без проверки на коллизии.
+
+Код — это base62 от id рецепта, пропущенного через 32-битную сеть
+Фейстеля: соседние рецепты получают непохожие коды, а обратное
+преобразование восстанавливает id без обращения к БД. Коды дополняются
+до SHORT_CODE_LENGTH символов и поэтому не пересекаются со старыми
+случайными кодами длины LEGACY_SHORT_CODE_LENGTH.
+"""
+import string
+
+from api.constants import LEGACY_SHORT_CODE_LENGTH, SHORT_CODE_LENGTH
+
+ALPHABET = f'{string.digits}{string.ascii_letters}'
+BASE = len(ALPHABET)
+FEISTEL_DOMAIN = 1 << 32
+FEISTEL_KEYS = (0x5A17, 0x2C4B, 0x7E91, 0x13D5)
+HALF_MASK = 0xFFFF
+
+
+def _round(half, key):
+    return ((half * 0x9E37 + key) ^ (half >> 7)) & HALF_MASK
+
+
+def _feistel(value, keys):
+    left, right = value >> 16, value & HALF_MASK
+    for key in keys:
+        left, right = right, left ^ _round(right, key)
+    return (right << 16) | left
+
+
+def permute(value):
+    """Взаимно однозначная перестановка чисел из [0, 2**32)."""
+    return _feistel(value, FEISTEL_KEYS)
+
+
+def unpermute(value):
+    return _feistel(value, reversed(FEISTEL_KEYS))
+
+
+def encode(recipe_id):
+    value = permute(recipe_id) if recipe_id < FEISTEL_DOMAIN else recipe_id
+    digits = []
+    while value:
+        value, remainder = divmod(value, BASE)
+        digits.append(ALPHABET[remainder])
+    return ''.join(reversed(digits)).rjust(SHORT_CODE_LENGTH, ALPHABET[0])
+
+
+def decode(code):
+    """id рецепта по коду или None, если код не выдавался этой схемой."""
+    if (
+        len(code) == LEGACY_SHORT_CODE_LENGTH
+        or len(code) < SHORT_CODE_LENGTH
+    ):
+        return None
+    value = 0
+    for char in code:
+        position = ALPHABET.find(char)
+        if position < 0:
+            return None
+        value = value * BASE + position
+    recipe_id = unpermute(value) if value < FEISTEL_DOMAIN else value
+    if not recipe_id or encode(recipe_id) != code:
+        return None
+    return recipe_id
@@ -0,0 +1,360 @@
+"""Перенос рецептов в формате JSON Lines: одна строка — один рецепт.
+
+Строка содержит автора, название, описание, время приготовления, дату
+создания, картинку и ингредиенты с количествами. Картинка — имя файла
+в хранилище или data URL с base64, ингредиенты задаются названием и
+единицей измерения.
+"""
+import base64
+import mimetypes
+from collections import Counter, defaultdict
+from time import perf_counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from api.cache import invalidate_tags
+from api.constants import (
+    MAX_COOKING_TIME,
+    MAX_INGREDIENT_AMOUNT,
+    MAX_LENGTH_INGREDIENT_NAME,
+    MAX_LENGTH_MEASUREMENT_UNIT,
+    MAX_LENGTH_RECIPE_NAME,
+    MIN_COOKING_TIME,
+    MIN_INGREDIENT_AMOUNT,
+)
+from api.fields import Base64ImageField
+from api.utils import change_counter
+
+from .feed import fan_out_missing_recipes
+from .fulltext import update_search_index
+from .models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def get_progress(count, started):
+    """Строка прогресса: сколько рецептов обработано и с какой скоростью."""
+    elapsed = perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    return f'{count} рецептов за {elapsed:.1f} с ({rate:.0f} в секунду)'
+
+
+def recipe_to_record(recipe, embed_images=False):
+    """Запись JSON Lines для рецепта с загруженными автором и составом."""
+    image = recipe.image.name
+    if embed_images and image:
+        content_type = mimetypes.guess_type(image)[0] or 'image/png'
+        with recipe.image.open('rb') as file:
+            image = (
+                f'data:{content_type};base64,'
+                f'{base64.b64encode(file.read()).decode()}'
+            )
+    return {
+        'author': {
+            field: getattr(recipe.author, field) for field in AUTHOR_FIELDS
+        },
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'created': recipe.created.isoformat(),
+        'image': image,
+        'ingredients': [
+            {
+                'name': recipe_ingredient.ingredient.name,
+                'measurement_unit':
+                    recipe_ingredient.ingredient.measurement_unit,
+                'amount': recipe_ingredient.amount,
+            }
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        ],
+    }
+
+
+def _check_int(value, low, high, field):
+    if not isinstance(value, int) or not low <= value <= high:
+        raise ValueError(f'{field} должно быть целым от {low} до {high}')
+    return value
+
+
+def _check_str(value, max_length, field):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f'{field} должно быть непустой строкой')
+    if max_length is not None and len(value) > max_length:
+        raise ValueError(f'{field} длиннее {max_length} символов')
+    return value.strip()
+
+
+def save_image(image):
+    """Сохраняет data URL в хранилище и возвращает имя файла.
+
+    Хранилище адресует файлы по содержимому, поэтому повторный импорт
+    тех же картинок не создаёт копий. Прочие строки считаются именами
+    уже загруженных файлов.
+    """
+    if not image.startswith('data:'):
+        return image
+    try:
+        file = Base64ImageField().to_internal_value(image)
+    except ValidationError as error:
+        raise ValueError(f'image: {error.detail[0]}')
+    field = Recipe._meta.get_field('image')
+    return field.storage.save(
+        field.generate_filename(None, file.name), file
+    )
+
+
+def parse_record(record):
+    """Проверяет запись и приводит её к виду для RecipeImporter.
+
+    При ошибке бросает ValueError с описанием.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('строка должна содержать объект')
+    author = record.get('author')
+    if not isinstance(author, dict):
+        raise ValueError('author должен быть объектом')
+    ingredients = record.get('ingredients')
+    if not isinstance(ingredients, list) or not ingredients:
+        raise ValueError('ingredients должен быть непустым списком')
+
+    amounts = {}
+    for item in ingredients:
+        if not isinstance(item, dict):
+            raise ValueError('ингредиент должен быть объектом')
+        key = (
+            _check_str(
+                item.get('name'), MAX_LENGTH_INGREDIENT_NAME, 'name'
+            ),
+            _check_str(
+                item.get('measurement_unit'),
+                MAX_LENGTH_MEASUREMENT_UNIT,
+                'measurement_unit',
+            ),
+        )
+        if key in amounts:
+            raise ValueError(f'ингредиент {key[0]} указан дважды')
+        amounts[key] = _check_int(
+            item.get('amount'),
+            MIN_INGREDIENT_AMOUNT,
+            MAX_INGREDIENT_AMOUNT,
+            'amount',
+        )
+
+    created = record.get('created')
+    if created is not None:
+        created = parse_datetime(str(created))
+        if created is None:
+            raise ValueError('created должно быть датой в формате ISO 8601')
+
+    return {
+        'author': {
+            field: _check_str(author.get(field), None, field)
+            for field in AUTHOR_FIELDS
+        },
+        'name': _check_str(
+            record.get('name'), MAX_LENGTH_RECIPE_NAME, 'name'
+        ),
+        'text': _check_str(record.get('text'), None, 'text'),
+        'cooking_time': _check_int(
+            record.get('cooking_time'),
+            MIN_COOKING_TIME,
+            MAX_COOKING_TIME,
+            'cooking_time',
+        ),
+        'created': created,
+        'image': save_image(_check_str(record.get('image'), None, 'image')),
+        'ingredients': amounts,
+    }
+
+
+class RecipeImporter:
+    """Создаёт рецепты пачками, по транзакции на пачку.
+
+    Ингредиенты сопоставляются по одному словарю (название, единица) →
+    id, загруженному один раз; недостающие ингредиенты и авторы
+    создаются. Пачка обходится несколькими запросами независимо от
+    числа рецептов в ней.
+    """
+
+    def __init__(self):
+        self.ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        }
+        self.authors = {}
+        self.touched_authors = set()
+        self.created_ingredients = 0
+        self.created_authors = 0
+
+    def _resolve_authors(self, records):
+        """Находит или создаёт авторов записей.
+
+        Возвращает {email: ошибка} для авторов, которых нельзя создать:
+        их имя пользователя уже занято в базе или другим новым автором.
+        """
+        missing = {
+            record['author']['email']: record['author']
+            for record in records
+            if record['author']['email'] not in self.authors
+        }
+        if not missing:
+            return {}
+        self.authors.update(
+            User.objects.filter(
+                email__in=missing
+            ).values_list('email', 'id')
+        )
+        new_authors = {
+            email: author for email, author in missing.items()
+            if email not in self.authors
+        }
+        taken = set(
+            User.objects.filter(
+                username__in={
+                    author['username'] for author in new_authors.values()
+                }
+            ).values_list('username', flat=True)
+        )
+        rejected = {}
+        users = []
+        for email, author in new_authors.items():
+            if author['username'] in taken:
+                rejected[email] = (
+                    f'имя пользователя {author["username"]} уже занято '
+                    f'другим автором'
+                )
+                continue
+            taken.add(author['username'])
+            user = User(**author)
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users)
+        self.created_authors += len(users)
+        self.authors.update(
+            User.objects.filter(
+                email__in=[user.email for user in users]
+            ).values_list('email', 'id')
+        )
+        return rejected
+
+    def _load_ingredients(self, names):
+        """Дополняет словарь ингредиентами с названиями names."""
+        found = set()
+        for ingredient_id, name, measurement_unit in (
+            Ingredient.objects.filter(name__in=names).values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        ):
+            self.ingredients[(name, measurement_unit)] = ingredient_id
+            found.add((name, measurement_unit))
+        return found
+
+    def _resolve_ingredients(self, records):
+        missing = {
+            key
+            for record in records
+            for key in record['ingredients']
+            if key not in self.ingredients
+        }
+        if not missing:
+            return
+        # Ингредиенты могли появиться после загрузки словаря; такие не
+        # создаются и не засчитываются в created_ingredients.
+        names = {name for name, _ in missing}
+        missing -= self._load_ingredients(names)
+        if not missing:
+            return
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in missing
+            ],
+            ignore_conflicts=True,
+        )
+        self.created_ingredients += len(missing & self._load_ingredients(
+            {name for name, _ in missing}
+        ))
+
+    def import_batch(self, records):
+        """Создаёт рецепты пачки.
+
+        Возвращает число созданных рецептов и пары (номер записи в
+        пачке, ошибка) для пропущенных записей.
+        """
+        with transaction.atomic():
+            rejected = self._resolve_authors(records)
+            errors = [
+                (index, rejected[record['author']['email']])
+                for index, record in enumerate(records)
+                if record['author']['email'] in rejected
+            ]
+            if errors:
+                records = [
+                    record for record in records
+                    if record['author']['email'] not in rejected
+                ]
+            self._resolve_ingredients(records)
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=self.authors[record['author']['email']],
+                    name=record['name'],
+                    text=record['text'],
+                    cooking_time=record['cooking_time'],
+                    image=record['image'],
+                )
+                for record in records
+            ])
+            # bulk_create подставляет текущее время в auto_now_add-поле,
+            # поэтому исходные даты создания проставляются отдельно.
+            dated = []
+            for recipe, record in zip(recipes, records):
+                if record['created'] is not None:
+                    recipe.created = record['created']
+                    dated.append(recipe)
+            Recipe.objects.bulk_update(dated, ['created'])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient_id=self.ingredients[key],
+                    amount=amount,
+                )
+                for recipe, record in zip(recipes, records)
+                for key, amount in record['ingredients'].items()
+            ])
+            update_search_index([recipe.id for recipe in recipes])
+
+            added = Counter(recipe.author_id for recipe in recipes)
+            by_delta = defaultdict(list)
+            for author_id, delta in added.items():
+                by_delta[delta].append(author_id)
+            for delta, author_ids in by_delta.items():
+                change_counter(
+                    User.objects.filter(pk__in=author_ids),
+                    'recipes_count',
+                    delta,
+                )
+        self.touched_authors.update(added)
+        return len(recipes), errors
+
+    def finish(self):
+        """Раскладывает рецепты по лентам и сбрасывает кэш ответов.
+
+        Варианты картинок импорт не создаёт: для этого есть команда
+        generate_image_variants.
+        """
+        fan_out_missing_recipes(self.touched_authors)
+        tags = ['recipes']
+        tags.extend(
+            f'author:{author_id}' for author_id in self.touched_authors
+        )
+        if self.created_ingredients:
+            tags.append('ingredients')
+        invalidate_tags(*tags)
@@ -7,14 +7,18 @@ from .models import Subscription, User
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     list_display = (
-        'email', 'id', 'username', 'first_name', 'last_name', 'is_staff'
+        'email', 'id', 'username', 'first_name', 'last_name', 'is_staff',
+        'recipes_count', 'subscribers_count'
     )
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('username', 'email', 'first_name', 'last_name')
     ordering = ('id',)
+    readonly_fields = ('recipes_count', 'subscribers_count')
     
     fieldsets = BaseUserAdmin.fieldsets + (
-        ('Дополнительная информация', {'fields': ('avatar',)}),
+        ('Дополнительная информация', {
+            'fields': ('avatar', 'recipes_count', 'subscribers_count')
+        }),
     )
 
 
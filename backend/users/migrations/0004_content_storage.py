@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:25
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, default='', storage=api.storage.ContentAddressedStorage(), upload_to='users/avatars/', verbose_name='Аватар'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fill_updated(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.update(updated=models.F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_content_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Дата изменения'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_updated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 07:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants_source',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100, verbose_name='Аватар с готовыми вариантами'),
+        ),
+    ]
@@ -7,6 +7,7 @@ from api.constants import (
     MAX_LENGTH_LAST_NAME,
     MAX_LENGTH_USERNAME,
 )
+from api.storage import content_storage
 
 
 class User(AbstractUser):
@@ -31,9 +32,31 @@ class User(AbstractUser):
     avatar = models.ImageField(
         'Аватар',
         upload_to='users/avatars/',
+        storage=content_storage,
         blank=True,
         default='',
     )
+    avatar_variants_source = models.CharField(
+        'Аватар с готовыми вариантами',
+        max_length=100,
+        blank=True,
+        default='',
+        editable=False,
+    )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+    )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']